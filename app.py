@@ -1,5 +1,15 @@
 from dash import Dash, dcc, get_asset_url, html, page_container
 import dash_bootstrap_components as dbc
+import uuid
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from pages.bulk_export import export_blueprint
+from pages.cache_warmer import start_cache_warmer
+from pages.compression import compress_response
+from pages.data_api import api_blueprint
+from pages.geo_api import geo_blueprint
+from pages.response_cache import cache_blueprint
+from pages.vector_tiles import tile_blueprint
 
 # %%
 fontawesome_stylesheet = "https://use.fontawesome.com/releases/v5.8.1/css/all.css"
@@ -62,37 +72,61 @@ title_row = dbc.Container(
     fluid=True,
 )
 
-# App Layout
-app.layout = dbc.Container(
-    [
-        # title Div
-        html.Div(
-            [title_row],
-            style={
-                "height": "110px",
-                "width": "100%",
-                "backgroundColor": "DeepSkyBlue",
-                "margin-left": "auto",
-                "margin-right": "auto",
-                "margin-top": "15px",
-            },
-        ),
-        dcc.Loading(
-            children=page_container,
-            id="loading-map",
-            type="circle",
-            fullscreen=True,
-        ),
-    ],
-    fluid=True,
-)
+
+# App Layout (function: new session id per page load)
+def serve_layout():
+    return dbc.Container(
+        [
+            # session id: key of server-side results (kept until tab closes)
+            dcc.Store(id="session-id", storage_type="session", data=uuid.uuid4().hex),
+            # title Div
+            html.Div(
+                [title_row],
+                style={
+                    "height": "110px",
+                    "width": "100%",
+                    "backgroundColor": "DeepSkyBlue",
+                    "margin-left": "auto",
+                    "margin-right": "auto",
+                    "margin-top": "15px",
+                },
+            ),
+            dcc.Loading(
+                children=page_container,
+                id="loading-map",
+                type="circle",
+                fullscreen=True,
+            ),
+        ],
+        fluid=True,
+    )
+
+
+app.layout = serve_layout
 
 # to deploy using WSGI server
 server = app.server
+# behind the platform proxy (TLS termination): scheme and host of the client
+# request, so absolute urls (tile sources) are https on an https page
+server.wsgi_app = ProxyFix(server.wsgi_app, x_proto=1, x_host=1)
+# bulk exports: pre-generated files served from disk
+server.register_blueprint(export_blueprint)
+# read-only json data api
+server.register_blueprint(api_blueprint)
+# district boundaries by state and resolution (precompressed)
+server.register_blueprint(geo_blueprint)
+# district boundary vector tiles (tile map mode)
+server.register_blueprint(tile_blueprint)
+# cache sizes and hit counts (per worker)
+server.register_blueprint(cache_blueprint)
+# gzip callback payloads and static files (precompressed once)
+server.after_request(compress_response)
 # app tittle for web browser
 app.title = "NFHS"
 
 # %%
 # Run app and print out the application URL
 if __name__ == "__main__":
+    # gunicorn workers start theirs from gunicorn.conf.py
+    start_cache_warmer()
     app.run_server(debug=True)
@@ -0,0 +1,288 @@
+// district scatter in the browser: the server sends the national data of the
+// selected indicator pair once (scatter-data store) with the per-state
+// trendlines fitted; state selection, drawing and the overall trendline are
+// done here without a server round trip
+
+// least squares y = intercept + slope * x over complete pairs (null: fewer
+// than two pairs or constant x)
+function olsFit(xs, ys) {
+    const n = xs.length;
+    if (n < 2) {
+        return null;
+    }
+    let xMean = 0;
+    let yMean = 0;
+    for (let i = 0; i < n; i++) {
+        xMean += xs[i];
+        yMean += ys[i];
+    }
+    xMean /= n;
+    yMean /= n;
+
+    // centred sums of squares and cross-products
+    let sxx = 0;
+    let sxy = 0;
+    let syy = 0;
+    for (let i = 0; i < n; i++) {
+        const dx = xs[i] - xMean;
+        const dy = ys[i] - yMean;
+        sxx += dx * dx;
+        sxy += dx * dy;
+        syy += dy * dy;
+    }
+    if (sxx === 0) {
+        return null;
+    }
+    const slope = sxy / sxx;
+    return {
+        slope: slope,
+        intercept: yMean - slope * xMean,
+        r_squared: syy ? (sxy * sxy) / (sxx * syy) : null,
+        n_obs: n,
+    };
+}
+
+function round2(value) {
+    return value === null ? "N/A" : Math.round(value * 100) / 100;
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    scatter: {
+        // checked tree keys to the active selection (button label, session)
+        update_states_selector: function (checkedTree, statesIndex) {
+            const selected = checkedTree.includes("0")
+                ? "All India"
+                : checkedTree.map((key) => statesIndex[key.split("-")[1]]);
+            return [
+                "Active Selection: " +
+                    (selected === "All India"
+                        ? "All India"
+                        : `${selected.length} States`),
+                {states: selected},
+            ];
+        },
+
+        update_scatter: function (data, selections, trendScope) {
+            const hidden = {display: "none"};
+            if (!data) {
+                return Array(5).fill(window.dash_clientside.no_update);
+            }
+            if (!selections || !selections.states.length) {
+                return [data.no_data, [], "N/A", [], hidden];
+            }
+
+            // rows of the selected states (national rows sorted by state)
+            const allIndia = selections.states === "All India";
+            const selected = new Set(allIndia ? [] : selections.states);
+            const rows = [];
+            data.state.forEach((code, i) => {
+                if (allIndia || selected.has(data.states[code])) {
+                    rows.push(i);
+                }
+            });
+            if (!rows.length) {
+                return [data.no_data, [], "N/A", [], hidden];
+            }
+
+            // state colours in order of appearance (as plotly express)
+            const colorway = data.colorway;
+            const stateOrder = new Map();
+            rows.forEach((i) => {
+                if (!stateOrder.has(data.state[i])) {
+                    stateOrder.set(data.state[i], stateOrder.size);
+                }
+            });
+            const stateColor = (code) =>
+                colorway[stateOrder.get(code) % colorway.length];
+            const complete = rows.filter(
+                (i) => data.x[i] !== null && data.y[i] !== null
+            );
+
+            // markers: one WebGL trace coloured per point above the threshold,
+            // else a trace per state (legend by state)
+            const labels = data.labels;
+            const marker = {size: 14, opacity: 0.5, symbol: "circle"};
+            const traces = [];
+            const layout = Object.assign({}, data.layout);
+            if (complete.length > data.webgl_points) {
+                // no state legend: states are in the hover
+                layout.legend = Object.assign({}, layout.legend, {title: {text: ""}});
+                traces.push({
+                    type: "scattergl",
+                    mode: "markers",
+                    name: "",
+                    showlegend: false,
+                    x: rows.map((i) => data.x[i]),
+                    y: rows.map((i) => data.y[i]),
+                    customdata: rows.map((i) => [
+                        data.states[data.state[i]],
+                        data.district[i],
+                    ]),
+                    marker: Object.assign({}, marker, {
+                        color: rows.map((i) => stateColor(data.state[i])),
+                    }),
+                    hovertemplate:
+                        `${labels.x}=%{x}<br>${labels.y}=%{y}<br>` +
+                        "State=%{customdata[0]}<br>District name=%{customdata[1]}" +
+                        "<extra></extra>",
+                });
+            } else {
+                stateOrder.forEach((_, code) => {
+                    const name = data.states[code];
+                    const stateRows = rows.filter((i) => data.state[i] === code);
+                    traces.push({
+                        type: "scatter",
+                        mode: "markers",
+                        name: name,
+                        legendgroup: name,
+                        showlegend: true,
+                        x: stateRows.map((i) => data.x[i]),
+                        y: stateRows.map((i) => data.y[i]),
+                        customdata: stateRows.map((i) => [data.district[i]]),
+                        marker: Object.assign({}, marker, {color: stateColor(code)}),
+                        hovertemplate:
+                            `State=${name}<br>${labels.x}=%{x}<br>${labels.y}=%{y}<br>` +
+                            "District name=%{customdata[0]}<extra></extra>",
+                    });
+                });
+            }
+
+            // state averages: the selected state, else All India
+            const mean =
+                !allIndia && selections.states.length === 1
+                    ? data.means[selections.states[0]]
+                    : data.means["All India"];
+            const xMax = Math.max(
+                ...rows.filter((i) => data.x[i] !== null).map((i) => data.x[i])
+            );
+            const yMax = Math.max(
+                ...rows.filter((i) => data.y[i] !== null).map((i) => data.y[i])
+            );
+            const lineWidth = mean.x !== null || mean.y !== null ? 3 : 2;
+            const meanStyle = {
+                showarrow: true,
+                arrowhead: 2,
+                arrowcolor: "green",
+                arrowsize: 1.5,
+                font: {color: "green"},
+            };
+            const meanLine = {dash: "dash", width: 3, color: "green"};
+            const shapes = [];
+            const annotations = [];
+            if (mean.x !== null) {
+                shapes.push({
+                    type: "line",
+                    x0: mean.x,
+                    x1: mean.x,
+                    xref: "x",
+                    y0: 0,
+                    y1: 1,
+                    yref: "y domain",
+                    line: meanLine,
+                });
+                annotations.push(
+                    Object.assign({}, meanStyle, {
+                        x: mean.x,
+                        y: yMax,
+                        text: `${mean.name} ${data.mean_text.x}${mean.x.toFixed(0)}`,
+                    })
+                );
+            }
+            if (mean.y !== null) {
+                shapes.push({
+                    type: "line",
+                    x0: 0,
+                    x1: 1,
+                    xref: "x domain",
+                    y0: mean.y,
+                    y1: mean.y,
+                    yref: "y",
+                    line: meanLine,
+                });
+                annotations.push(
+                    Object.assign({}, meanStyle, {
+                        x: xMax,
+                        y: mean.y,
+                        xanchor: "left",
+                        text: `${mean.name} ${data.mean_text.y}${mean.y.toFixed(0)}`,
+                    })
+                );
+            }
+
+            // trendlines: overall, or one per state (with the fits table)
+            const fit = olsFit(
+                complete.map((i) => data.x[i]),
+                complete.map((i) => data.y[i])
+            );
+            const stateFits = [];
+            if (trendScope === "state") {
+                // per-state fits come with the data, indexed by state code
+                const fits = data.state_fits;
+                stateOrder.forEach((colour, code) => {
+                    if (fits.slope[code] === null) {
+                        return;
+                    }
+                    const name = data.states[code];
+                    const stateFit = {
+                        slope: fits.slope[code],
+                        intercept: fits.intercept[code],
+                        r_squared: fits.r_squared[code],
+                        n_obs: fits.n_obs[code],
+                    };
+                    const lineX = [fits.x_min[code], fits.x_max[code]];
+                    traces.push({
+                        type: "scatter",
+                        mode: "lines",
+                        name: name,
+                        legendgroup: name,
+                        showlegend: false,
+                        x: lineX,
+                        y: lineX.map((x) => stateFit.intercept + stateFit.slope * x),
+                        line: {color: colorway[colour % colorway.length], width: lineWidth},
+                        hovertemplate:
+                            `<b>${name} OLS trendline</b><br>` +
+                            `Slope=${stateFit.slope.toFixed(2)}<br>` +
+                            `R<sup>2</sup>=${
+                                stateFit.r_squared === null
+                                    ? "N/A"
+                                    : stateFit.r_squared.toFixed(2)
+                            }<extra></extra>`,
+                    });
+                    stateFits.push(Object.assign({State: name}, stateFit));
+                });
+            } else if (fit !== null) {
+                const lineX = complete.map((i) => data.x[i]).sort((a, b) => a - b);
+                traces.push({
+                    type: "scatter",
+                    mode: "lines",
+                    name: "Overall Trendline",
+                    legendgroup: "Overall Trendline",
+                    showlegend: true,
+                    x: lineX,
+                    y: lineX.map((x) => fit.intercept + fit.slope * x),
+                    line: {
+                        color: colorway[stateOrder.size % colorway.length],
+                        width: lineWidth,
+                    },
+                    hovertemplate: `<b>OLS trendline</b><br>R<sup>2</sup>=${round2(
+                        fit.r_squared
+                    )}`,
+                });
+            }
+
+            return [
+                {
+                    data: traces,
+                    layout: Object.assign(layout, {
+                        shapes: shapes,
+                        annotations: annotations,
+                    }),
+                },
+                data.card_title,
+                `R2 of the correlation: ${fit === null ? "N/A" : round2(fit.r_squared)}`,
+                stateFits,
+                stateFits.length ? {display: "block"} : hidden,
+            ];
+        },
+    },
+});
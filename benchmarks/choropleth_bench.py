@@ -0,0 +1,83 @@
+import json
+import timeit
+
+import plotly.express as px
+from plotly.utils import PlotlyJSONEncoder
+
+# run from the repository root: python -m benchmarks.choropleth_bench
+from pages import district_geo_dict, district_map_df, geo_json_dict
+from pages.figure_factory import choropleth_figure, customed_color_scale
+
+# %%
+# All India frame for one indicator (NFHS-5 values, NaN as -1000)
+kpi = district_map_df.variable.iloc[0]
+display_df = (
+    district_map_df.query("variable == @kpi & Round == 'NFHS-5'")
+    .drop_duplicates(subset=["District_geo"])
+    .reset_index(drop=True)
+)
+display_df["Note_NFHS5"] = "Value Reported"
+display_df.loc[display_df.value.isnull(), "Note_NFHS5"] = "Value NOT Reported: (-1000)"
+full_range = [display_df.value.min() - 0.5, display_df.value.max()]
+display_df["value"] = display_df.value.fillna(-1000)
+
+
+# previous path: plotly express + four validated update passes
+def px_path():
+    cm_fig = px.choropleth(
+        display_df,
+        geojson=geo_json_dict,
+        featureidkey="properties.707_dist_7",
+        locations="District_geo",
+        color="value",
+        labels={
+            "District_geo": "District, State",
+            "value": "NFHS-5 Value",
+            "Note_NFHS5": "Note",
+        },
+        hover_data=["Note_NFHS5"],
+        color_continuous_scale=customed_color_scale,
+        range_color=full_range,
+        projection="mercator",
+        height=550,
+    )
+    cm_fig.update_geos(fitbounds="locations", visible=False)
+    cm_fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0})
+    cm_fig.update_coloraxes(colorbar_len=0.85, colorbar_x=0.78)
+    cm_fig.update_traces(marker_line_color="Gainsboro", marker_line_width=0.5)
+    return cm_fig
+
+
+# figure factory: prebuilt layout, plain dict trace from numpy arrays
+def factory_path():
+    return choropleth_figure(
+        geo_json_dict,
+        display_df.District_geo.values,
+        display_df.value.values,
+        display_df.Note_NFHS5.values,
+        "NFHS-5 Value",
+        full_range,
+    )
+
+
+# both timed up to the json Dash sends back (figure build + serialization)
+def timed(build, repeat=5, number=3):
+    best = min(
+        timeit.repeat(
+            lambda: json.dumps(build(), cls=PlotlyJSONEncoder),
+            repeat=repeat,
+            number=number,
+        )
+    )
+    return best / number * 1000
+
+
+# %%
+if __name__ == "__main__":
+    print(f"All India choropleth: {len(display_df)} districts, indicator '{kpi}'")
+    print(f"  {len(district_geo_dict['All India'])} matched district geometries")
+    px_ms = timed(px_path)
+    factory_ms = timed(factory_path)
+    print(f"  px.choropleth + update_cm_fig: {px_ms:8.1f} ms")
+    print(f"  choropleth_figure (dict):      {factory_ms:8.1f} ms")
+    print(f"  speed-up: {px_ms / factory_ms:.1f}x")
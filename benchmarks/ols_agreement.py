@@ -0,0 +1,119 @@
+import json
+import subprocess
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# run from the repository root: python -m benchmarks.ols_agreement
+# (statsmodels and node are only needed here, not by the app)
+import statsmodels.api as sm
+
+from pages import district_kpi_pos, district_round_values, district_states
+from pages.analytics import grouped_ols_fit
+
+# %%
+# district scatter pairs: NFHS-4 (x) vs. NFHS-5 (y) of random indicator pairs
+rng = np.random.default_rng(0)
+kpi_cols = rng.choice(len(district_kpi_pos), size=(200, 2))
+pairs = [
+    (district_round_values["NFHS-4"][:, i], district_round_values["NFHS-5"][:, j])
+    for i, j in kpi_cols
+]
+# pairs with a trendline (indicators missing in a round have none)
+pairs = [(x, y) for x, y in pairs if (~(np.isnan(x) | np.isnan(y))).sum() > 2]
+state_codes, states = pd.factorize(district_states)
+
+
+# reference: what px trendline="ols" fitted (statsmodels OLS with a constant)
+def statsmodels_fit(x, y):
+    valid = ~(np.isnan(x) | np.isnan(y))
+    return sm.OLS(y[valid], sm.add_constant(x[valid])).fit()
+
+
+# overall trendline: olsFit of assets/scatter_filter.js over the complete pairs
+# of every indicator pair, in one node run (pairs on stdin, fits on stdout)
+js_fit_script = """
+global.window = {};
+require("vm").runInThisContext(require("fs").readFileSync(process.argv[1], "utf8"));
+const pairs = JSON.parse(require("fs").readFileSync(0, "utf8"));
+console.log(JSON.stringify(pairs.map(([xs, ys]) => olsFit(xs, ys))));
+"""
+
+
+def js_fits(pairs):
+    complete = []
+    for x, y in pairs:
+        valid = ~(np.isnan(x) | np.isnan(y))
+        complete.append([x[valid].tolist(), y[valid].tolist()])
+    result = subprocess.run(
+        ["node", "-e", js_fit_script, str(Path("assets", "scatter_filter.js"))],
+        input=json.dumps(complete),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def relative_diff(value, expected):
+    return abs(value - expected) / max(abs(expected), 1)
+
+
+# %%
+if __name__ == "__main__":
+    max_diff = {"slope": 0, "intercept": 0, "r_squared": 0}
+    for fit, (x, y) in zip(js_fits(pairs), pairs):
+        reference = statsmodels_fit(x, y)
+        intercept, slope = reference.params
+        for name, expected in [
+            ("slope", slope),
+            ("intercept", intercept),
+            ("r_squared", reference.rsquared),
+        ]:
+            max_diff[name] = max(max_diff[name], relative_diff(fit[name], expected))
+    print(f"{len(pairs)} indicator pairs, max relative difference vs. statsmodels:")
+    print("overall trendline (olsFit, browser)")
+    for name, diff in max_diff.items():
+        print(f"  {name:10s} {diff:.2e}")
+    assert max(max_diff.values()) < 1e-9
+
+    # per-state trendlines: grouped_ols_fit vs. a statsmodels fit per state
+    max_diff = {"slope": 0, "intercept": 0, "r_squared": 0}
+    for x, y in pairs:
+        fits = grouped_ols_fit(x, y, state_codes, len(states))
+        for code in range(len(states)):
+            in_state = state_codes == code
+            valid = in_state & ~(np.isnan(x) | np.isnan(y))
+            if valid.sum() < 3 or np.ptp(x[valid]) == 0 or np.ptp(y[valid]) == 0:
+                continue
+            reference = statsmodels_fit(x[in_state], y[in_state])
+            intercept, slope = reference.params
+            for name, expected in [
+                ("slope", slope),
+                ("intercept", intercept),
+                ("r_squared", reference.rsquared),
+            ]:
+                diff = relative_diff(getattr(fits, name)[code], expected)
+                max_diff[name] = max(max_diff[name], diff)
+    print("per-state trendlines (grouped_ols_fit, server)")
+    for name, diff in max_diff.items():
+        print(f"  {name:10s} {diff:.2e}")
+    assert max(max_diff.values()) < 1e-9
+
+    # timing on the first pair, statsmodels over the states it can fit
+    x, y = pairs[0]
+    fitted = [
+        state_codes == code
+        for code in np.flatnonzero(
+            grouped_ols_fit(x, y, state_codes, len(states)).n_obs > 2
+        )
+    ]
+    timings = {
+        "grouped_ols_fit": lambda: grouped_ols_fit(x, y, state_codes, len(states)),
+        "statsmodels": lambda: [statsmodels_fit(x[rows], y[rows]) for rows in fitted],
+    }
+    for name, fit_function in timings.items():
+        seconds = min(timeit.repeat(fit_function, number=10, repeat=5))
+        print(f"{name:16s} {seconds * 100:.3f} ms for all states")
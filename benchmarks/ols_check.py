@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+# run from the repository root: python -m benchmarks.ols_check
+# (numpy only: checks the per-state trendlines without statsmodels or node)
+from pages import district_kpi_pos, district_round_values, district_states
+from pages.analytics import grouped_ols_fit
+
+# %%
+# district scatter pairs: NFHS-4 (x) vs. NFHS-5 (y) of random indicator pairs
+rng = np.random.default_rng(0)
+kpi_cols = rng.choice(len(district_kpi_pos), size=(200, 2))
+pairs = [
+    (district_round_values["NFHS-4"][:, i], district_round_values["NFHS-5"][:, j])
+    for i, j in kpi_cols
+]
+state_codes, states = pd.factorize(district_states)
+
+
+# reference per group: np.polyfit line and squared np.corrcoef (None: no fit)
+def reference_fit(x, y):
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[valid], y[valid]
+    if len(x) < 3 or np.ptp(x) == 0 or np.ptp(y) == 0:
+        return None
+    slope, intercept = np.polyfit(x, y, 1)
+    return slope, intercept, np.corrcoef(x, y)[0, 1] ** 2, len(x), x.min(), x.max()
+
+
+def relative_diff(value, expected):
+    return abs(value - expected) / max(abs(expected), 1)
+
+
+# %%
+if __name__ == "__main__":
+    names = ["slope", "intercept", "r_squared", "n_obs", "x_min", "x_max"]
+    max_diff = dict.fromkeys(names, 0)
+    n_fits = 0
+    for x, y in pairs:
+        fits = grouped_ols_fit(x, y, state_codes, len(states))
+        for code in range(len(states)):
+            in_state = state_codes == code
+            expected = reference_fit(x[in_state], y[in_state])
+            if expected is None:
+                continue
+            n_fits += 1
+            for name, value in zip(names, expected):
+                diff = relative_diff(getattr(fits, name)[code], value)
+                max_diff[name] = max(max_diff[name], diff)
+    print(f"{n_fits} state fits, max relative difference vs. np.polyfit/corrcoef:")
+    for name, diff in max_diff.items():
+        print(f"  {name:10s} {diff:.2e}")
+    assert max(max_diff.values()) < 1e-9
+
+    # groups without a line: one pair, constant x, all missing, no rows
+    x = np.array([1.0, 2.0, 5.0, 5.0, np.nan, 3.0, 4.0, 6.0])
+    y = np.array([1.0, 3.0, 2.0, 4.0, 1.0, np.nan, 2.0, 3.0])
+    codes = np.array([0, 1, 1, 1, 2, 2, 3, 3])
+    fits = grouped_ols_fit(x, y, codes, 5)
+    assert fits.n_obs.tolist() == [1, 3, 0, 2, 0]
+    assert np.isnan(fits.slope[[0, 2, 4]]).all()
+    assert np.isnan(fits.x_min[[2, 4]]).all()
+    assert np.allclose([fits.slope[3], fits.intercept[3]], [0.5, 0])
+    assert np.isclose(fits.r_squared[3], 1)
+    # repeated x values still fit
+    assert np.allclose(
+        [fits.slope[1], fits.intercept[1]], np.polyfit([2, 5, 5], [3, 2, 4], 1)
+    )
+    constant = grouped_ols_fit([2.0, 2.0], [1.0, 3.0], [0, 0], 1)
+    assert np.isnan(constant.slope[0]) and np.isnan(constant.r_squared[0])
+    print("edge cases OK")
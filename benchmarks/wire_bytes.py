@@ -0,0 +1,141 @@
+import gzip
+import json
+import re
+import time
+
+# run from the repository root: python -m benchmarks.wire_bytes
+from app import app, server
+from pages import equity_kpi_index, nfhs_dist_ind_df
+from pages.compression import compress_level
+
+# %%
+client = server.test_client()
+# first request: dash registers the page callbacks in app.callback_map
+client.get("/")
+kpi = nfhs_dist_ind_df.district_kpi.iloc[10]
+kpi_domain = nfhs_dist_ind_df.ind_domain.iloc[10]
+
+
+# _dash-update-component body for the callback writing `output` (id.property)
+def callback_body(output, values):
+    key = next(key for key in app.callback_map if output in key.strip(".").split("..."))
+    spec = app.callback_map[key]
+
+    def props(deps):
+        return [
+            {**dep, "value": values.get(f"{dep['id']}.{dep['property']}")}
+            for dep in deps
+        ]
+
+    inputs = props(spec["inputs"])
+    outputs = [
+        {"id": part.split(".")[0], "property": part.split(".")[1]}
+        for part in key.strip(".").split("...")
+    ]
+    return {
+        "output": key,
+        # multi-output callbacks ("..a.b...c.d..") get a list
+        "outputs": outputs if key.startswith("..") else outputs[0],
+        "inputs": inputs,
+        "state": props(spec["state"]),
+        "changedPropIds": [f"{dep['id']}.{dep['property']}" for dep in inputs],
+    }
+
+
+def district_map_body(scope, value_or_change, map_mode="choropleth"):
+    return callback_body(
+        "district-or-state-plot.figure",
+        {
+            "india-or-state-dd.value": scope,
+            "kpi-district-map-dd.value": kpi,
+            "radios-change.value": value_or_change,
+            "radios-map-mode.value": map_mode,
+            "kpi-bivar-dd.value": nfhs_dist_ind_df.district_kpi.iloc[20],
+            "kpi-domain-map-dd.value": kpi_domain,
+        },
+    )
+
+
+callback_views = {
+    "district map, All India": district_map_body("All India", "value"),
+    "district map, All India change": district_map_body("All India", "Abs_Change"),
+    "district map, Uttar Pradesh": district_map_body("Uttar Pradesh", "value"),
+    "district map, All India tiles": district_map_body("All India", "value", "tiles"),
+    "district map, All India bivariate": district_map_body("All India", "bivariate"),
+    "district table page": callback_body(
+        "district-table.data",
+        {
+            "district-table.page_current": 0,
+            "district-table.page_size": 25,
+            "india-or-state-dd.value": "All India",
+            "kpi-district-map-dd.value": kpi,
+        },
+    ),
+    "equity plot, All India": callback_body(
+        "state-equity-plot.figure",
+        {
+            "dd-states-equity.value": "All India",
+            "dd-equity-round.value": "NFHS-5 (2019-21)",
+            "dd-equity-disagg.value": "Wealth",
+            "equity-session.data": {"kpis": list(equity_kpi_index.values())},
+        },
+    ),
+}
+
+
+# bytes on the wire and server time, without and with gzip
+def measure(method, url, **kwargs):
+    sizes = []
+    for headers in [{}, {"Accept-Encoding": "gzip"}]:
+        start = time.perf_counter()
+        response = getattr(client, method)(url, headers=headers, **kwargs)
+        elapsed = time.perf_counter() - start
+        sizes.append((len(response.data), elapsed * 1000))
+    return sizes
+
+
+def report(name, sizes):
+    (raw, raw_ms), (wire, wire_ms) = sizes
+    print(
+        f"  {name[:48]:48s} {raw / 1024:9.1f} KiB -> {wire / 1024:8.1f} KiB "
+        f"({raw / max(wire, 1):4.1f}x)  {raw_ms:6.1f} ms / {wire_ms:6.1f} ms"
+    )
+
+
+# %%
+if __name__ == "__main__":
+    print(f"gzip level {compress_level} (callbacks), 9 (static, precompressed)")
+    print("  view                                                  raw -> on wire")
+
+    page = client.get("/district-gis").data.decode()
+    report("page /district-gis", measure("get", "/district-gis"))
+    for src in re.findall(r'(?:src|href)="([^"]+\.(?:js|css)[^"]*)"', page):
+        if src.startswith("/"):
+            # first request compresses (or loads) the static file, then cached
+            client.get(src, headers={"Accept-Encoding": "gzip"})
+            report(src.split("?")[0].split("/")[-1], measure("get", src))
+
+    for name, body in callback_views.items():
+        # first request fills the response cache: measure payloads only
+        client.post("/_dash-update-component", json=body)
+        report(name, measure("post", "/_dash-update-component", json=body))
+
+    # compression level vs latency on the largest payload
+    payload = client.post(
+        "/_dash-update-component", json=callback_views["district map, All India"]
+    ).data
+    print(f"\ngzip levels, district map All India ({len(payload) / 1024:.0f} KiB)")
+    for level in [1, 4, 6, 9]:
+        start = time.perf_counter()
+        size = len(gzip.compress(payload, level))
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"  level {level}: {size / 1024:8.1f} KiB  {elapsed:6.1f} ms")
+    assert json.loads(
+        gzip.decompress(
+            client.post(
+                "/_dash-update-component",
+                json=callback_views["district map, All India"],
+                headers={"Accept-Encoding": "gzip"},
+            ).data
+        )
+    )
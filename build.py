@@ -0,0 +1,229 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+import re
+import statistics
+import time
+
+# dash pages must be registered (app instantiated) before importing them
+from app import app, server  # noqa: F401
+from pages import district_map_options, nfhs_dist_ind_df, state_options
+from pages.bulk_export import (
+    export_domain_kpis,
+    export_formats,
+    remove_stale_exports,
+    write_export,
+)
+from pages.district_gis import disp_in_district_map
+from pages.geo_api import geo_levels, geo_path, geo_scopes, write_geo
+from pages.response_cache import (
+    disk_cache,
+    response_key,
+    serialize_outputs,
+)
+from pages.vector_tiles import (
+    remove_stale_tiles,
+    tile_layers,
+    tile_max_zoom,
+    tile_min_zoom,
+    write_tiles,
+)
+
+
+# %%
+# district map views: every scope x indicator x value/change/animated x map mode
+def district_map_views():
+    kpi_domain = dict(zip(nfhs_dist_ind_df.district_kpi, nfhs_dist_ind_df.ind_domain))
+    return [
+        (
+            scope["value"],
+            kpi["value"],
+            value_or_change,
+            map_mode,
+            # second indicator: bivariate map only (computed on request)
+            None,
+            kpi_domain[kpi["value"]],
+        )
+        for scope in state_options
+        for kpi in district_map_options
+        for value_or_change in ["value", "Abs_Change", "animate"]
+        for map_mode in ["choropleth", "tiles"]
+    ]
+
+
+# worker: compute one view bypassing the caches (same key as the callback)
+def render_district_map(args):
+    start = time.perf_counter()
+    payload = serialize_outputs(disp_in_district_map.__wrapped__(*args))
+    return response_key("district-map", args), payload, time.perf_counter() - start
+
+
+# precompute all district map views in a process pool into the shared cache
+def build_maps(workers):
+    views = district_map_views()
+    print(f"Precomputing {len(views)} district map views with {workers} workers")
+    start = time.perf_counter()
+    item_seconds = []
+    total_bytes = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for key, payload, seconds in pool.map(render_district_map, views, chunksize=8):
+            disk_cache.put(key, payload)
+            item_seconds.append(seconds)
+            total_bytes += len(payload)
+    elapsed = time.perf_counter() - start
+
+    # build report
+    store_stats = disk_cache.stats()
+    print(f"Total build time: {elapsed:.1f} s")
+    print(
+        "Per-item cost: "
+        f"mean {statistics.mean(item_seconds) * 1000:.0f} ms, "
+        f"median {statistics.median(item_seconds) * 1000:.0f} ms, "
+        f"max {max(item_seconds) * 1000:.0f} ms"
+    )
+    print(f"Total serialized bytes: {total_bytes / 1024 ** 2:.1f} MiB")
+    print(
+        f"Shared cache: {store_stats['entries']} entries, "
+        f"{store_stats['bytes'] / 1024 ** 2:.1f} MiB compressed "
+        f"(bound {store_stats['max_bytes'] / 1024 ** 2:.0f} MiB)"
+    )
+    if store_stats["entries"] < len(views):
+        print("Shared cache bound exceeded: raise NFHS_DISK_CACHE_MAX_BYTES")
+
+
+# %%
+# bulk exports: every scope x domain (and all indicators) x format
+def export_views():
+    return [
+        (scope["value"], domain, file_format)
+        for scope in state_options
+        for domain in export_domain_kpis
+        for file_format in export_formats
+    ]
+
+
+# worker: write one export file, return its size
+def render_export(args):
+    start = time.perf_counter()
+    path = write_export(*args)
+    return os.path.getsize(path), time.perf_counter() - start
+
+
+def build_exports(workers):
+    remove_stale_exports()
+    views = export_views()
+    print(f"Writing {len(views)} bulk export files with {workers} workers")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(render_export, views, chunksize=4))
+    elapsed = time.perf_counter() - start
+
+    # build report
+    item_seconds = [seconds for _, seconds in results]
+    print(f"Total build time: {elapsed:.1f} s")
+    print(
+        "Per-file cost: "
+        f"mean {statistics.mean(item_seconds) * 1000:.0f} ms, "
+        f"max {max(item_seconds) * 1000:.0f} ms"
+    )
+    print(f"Total file size: {sum(size for size, _ in results) / 1024 ** 2:.1f} MiB")
+
+
+# %%
+# district boundaries: every scope x simplification level (gzip files)
+def render_geo(args):
+    start = time.perf_counter()
+    path = write_geo(*args)
+    return os.path.getsize(path), time.perf_counter() - start
+
+
+def build_geo(workers):
+    views = [(scope, level) for scope in geo_scopes for level in geo_levels]
+    print(f"Writing {len(views)} geometry files with {workers} workers")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(render_geo, views))
+    print(f"Total build time: {time.perf_counter() - start:.1f} s")
+    # national file per level: compressed size
+    for level in geo_levels:
+        size = os.path.getsize(geo_path("All India", level))
+        print(f"All India ({level}): {size / 1024:.0f} KiB gzip")
+    print(f"Total file size: {sum(size for size, _ in results) / 1024 ** 2:.1f} MiB")
+
+
+# %%
+# vector tiles: every boundary layer x zoom (gzip .pbf files)
+def render_tiles(args):
+    start = time.perf_counter()
+    tile_count, tile_bytes = write_tiles(*args)
+    return args, tile_count, tile_bytes, time.perf_counter() - start
+
+
+def build_tiles(workers):
+    remove_stale_tiles()
+    views = [
+        (layer_name, zoom)
+        for layer_name in tile_layers
+        for zoom in range(tile_min_zoom, tile_max_zoom + 1)
+    ]
+    print(f"Cutting {len(views)} layer zooms of vector tiles with {workers} workers")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(render_tiles, views))
+    print(f"Total build time: {time.perf_counter() - start:.1f} s")
+    for (layer_name, zoom), tile_count, tile_bytes, seconds in results:
+        print(
+            f"{layer_name} z{zoom}: {tile_count} tiles, "
+            f"{tile_bytes / 1024:.0f} KiB gzip, {seconds:.1f} s"
+        )
+    total_bytes = sum(tile_bytes for _, _, tile_bytes, _ in results)
+    print(f"Total file size: {total_bytes / 1024 ** 2:.1f} MiB")
+
+
+# %%
+# static files: precompress every script/stylesheet the pages load
+def build_static():
+    client = server.test_client()
+    page = client.get("/").data.decode()
+    static_urls = [
+        src
+        for src in re.findall(r'(?:src|href)="([^"]+\.(?:js|css)[^"]*)"', page)
+        if src.startswith("/")
+    ]
+    raw_bytes = wire_bytes = 0
+    for src in static_urls:
+        raw_bytes += len(client.get(src).data)
+        wire_bytes += len(client.get(src, headers={"Accept-Encoding": "gzip"}).data)
+    print(
+        f"Precompressed {len(static_urls)} static files: "
+        f"{raw_bytes / 1024 ** 2:.1f} MiB -> {wire_bytes / 1024 ** 2:.1f} MiB gzip"
+    )
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NFHS dashboard build commands")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="processes in the build pool (default: all cores)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("maps", help="precompute every district map view")
+    commands.add_parser("exports", help="write every bulk export file")
+    commands.add_parser("geo", help="write every district geometry file")
+    commands.add_parser("tiles", help="cut the boundary vector tiles")
+    commands.add_parser("static", help="precompress the app scripts and styles")
+    args = parser.parse_args()
+
+    if args.command == "maps":
+        build_maps(args.workers)
+    elif args.command == "exports":
+        build_exports(args.workers)
+    elif args.command == "geo":
+        build_geo(args.workers)
+    elif args.command == "tiles":
+        build_tiles(args.workers)
+    elif args.command == "static":
+        build_static()
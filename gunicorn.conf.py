@@ -0,0 +1,9 @@
+# gunicorn settings (read from the working directory: gunicorn app:server)
+
+
+# pre-warm most requested responses in the background, once per worker after
+# the app is loaded (not at import: scripts importing app start no thread)
+def post_worker_init(worker):
+    from pages.cache_warmer import start_cache_warmer
+
+    start_cache_warmer()
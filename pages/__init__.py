@@ -1,10 +1,18 @@
 from difflib import get_close_matches
 from geojson_rewind import rewind
+import hashlib
 import json
 import numpy as np
 import pandas as pd
 import re
 
+from .analytics import (
+    nearest_rows,
+    pairwise_correlation,
+    standardize_columns,
+    upper_triangle,
+)
+
 # %%
 # geojson all
 json_file = "./datasets/districts_707_india.json"
@@ -1107,6 +1115,152 @@ for an_entry in checked_aspir_entries:
         an_entry, checked_aspir_entries[an_entry].keys()
     ] = checked_aspir_entries[an_entry].values()
 
+# %%
+# programme membership as boolean columns aligned with the district index
+programme_scopes = ["All India Aspirational", "All India Gavi", "All India LaQshya"]
+district_index_df = state_district_geo_df.set_index(["State", "District name"])
+for a_programme in programme_scopes:
+    district_index_df[a_programme] = district_index_df.index.map(",".join).isin(
+        aspir_dist_df.index[aspir_dist_df[a_programme].astype(bool)]
+    )
+
+
+# %%
+# district x indicator matrices per round, aligned with district_index_df rows
+district_kpi_pos = {kpi: j for j, kpi in enumerate(district_kpi_map)}
+district_round_values = {
+    a_round: district_map_df.query("Round == @a_round")
+    .pivot(index=["State", "District name"], columns="variable", values="value")
+    .reindex(index=district_index_df.index, columns=district_kpi_map)
+    .to_numpy(dtype="float64")
+    for a_round in ["NFHS-4", "NFHS-5"]
+}
+district_change_values = (
+    district_round_values["NFHS-5"] - district_round_values["NFHS-4"]
+)
+district_geo_keys = district_index_df.District_geo.to_numpy()
+district_states = district_index_df.index.get_level_values("State").to_numpy()
+district_names = district_index_df.index.get_level_values("District name").to_numpy()
+# district rows ordered by state and district name (as a pivot would sort)
+district_sorted_rows = np.lexsort((district_names, district_states))
+
+# wide district matrix: (indicator, round) columns with change, integer lookup
+district_wide_rounds = ["NFHS-4", "NFHS-5", "NFHS-5 minus NFHS-4"]
+district_wide_values = np.hstack(
+    [
+        district_round_values["NFHS-4"],
+        district_round_values["NFHS-5"],
+        district_change_values,
+    ]
+)
+district_wide_pos = {
+    (kpi, a_round): i * len(district_kpi_map) + j
+    for i, a_round in enumerate(district_wide_rounds)
+    for j, kpi in enumerate(district_kpi_map)
+}
+
+# indicator x indicator correlations across all districts, per round and for
+# change (packed upper triangle, float32; see analytics.packed_row)
+district_kpi_corr = {
+    a_round: upper_triangle(
+        pairwise_correlation(
+            district_wide_values[
+                :, i * len(district_kpi_map) : (i + 1) * len(district_kpi_map)
+            ]
+        )
+    )
+    for i, a_round in enumerate(district_wide_rounds)
+}
+
+# district similarity: wide matrix standardized per column (float32) and the
+# nearest districts of every district per profile (k-nn index, national)
+district_wide_scaled = standardize_columns(district_wide_values).astype("float32")
+district_profiles = {
+    "NFHS-5": ["NFHS-5"],
+    "Change": ["NFHS-5 minus NFHS-4"],
+    "NFHS-5 and Change": ["NFHS-5", "NFHS-5 minus NFHS-4"],
+}
+similar_districts_max = 50
+district_neighbours = {
+    a_profile: nearest_rows(
+        district_wide_scaled[
+            :,
+            [
+                district_wide_pos[(kpi, a_round)]
+                for a_round in profile_rounds
+                for kpi in district_kpi_map
+            ],
+        ].astype("float64"),
+        similar_districts_max,
+    )
+    for a_profile, profile_rounds in district_profiles.items()
+}
+
+
+# map scopes: district rows (programme members first, they win shared geometries)
+def scope_row_positions(scope):
+    if scope in programme_scopes:
+        in_programme = district_index_df[scope].to_numpy()
+        return np.concatenate(
+            [np.flatnonzero(in_programme), np.flatnonzero(~in_programme)]
+        )
+    elif scope == "All India":
+        return np.arange(len(district_index_df))
+    return np.flatnonzero(district_states == scope)
+
+
+# rows drawn on the map: first district row per geometry key
+scope_geo_rows = {}
+# rows in selection (programme members or all rows in state/India)
+scope_selected_rows = {}
+# positions in scope_geo_rows outside the programme selection (-500)
+scope_unselected_pos = {}
+for a_scope in [a_state["value"] for a_state in state_options]:
+    rows = scope_row_positions(a_scope)
+    geo_rows = rows[~pd.Index(district_geo_keys[rows]).duplicated()]
+    selected = (
+        district_index_df[a_scope].to_numpy()
+        if a_scope in programme_scopes
+        else np.ones(len(district_index_df), dtype=bool)
+    )
+    scope_geo_rows[a_scope] = geo_rows
+    scope_selected_rows[a_scope] = rows[selected[rows]]
+    scope_unselected_pos[a_scope] = np.flatnonzero(~selected[geo_rows])
+
+# positions in scope_geo_rows without data per scope, indicator and map mode
+# (-1000 sentinel), only within the selection (NFHS-4: animated map frame)
+scope_missing_pos = {}
+for a_scope, geo_rows in scope_geo_rows.items():
+    is_unselected = np.zeros(len(geo_rows), dtype=bool)
+    is_unselected[scope_unselected_pos[a_scope]] = True
+    for a_mode, mode_values in [
+        ("value", district_round_values["NFHS-5"]),
+        ("Abs_Change", district_change_values),
+        ("NFHS-4", district_round_values["NFHS-4"]),
+    ]:
+        missing = np.isnan(mode_values[geo_rows]) & ~is_unselected[:, None]
+        for j, kpi in enumerate(district_kpi_map):
+            scope_missing_pos[(a_scope, kpi, a_mode)] = np.flatnonzero(
+                missing[:, j]
+            ).astype(np.int32)
+
+
+# %%
+# data snapshot version: hash of ingested files (invalidates cached responses)
+data_files = [
+    json_file,
+    "./datasets/NFHS4-5 District compiled file.xlsx",
+    "./datasets/NFHS- 5 compiled factsheet for INDIA.xlsx",
+    "./datasets/NFHS345.xlsx",
+    "./datasets/Equity_Analysis.xlsx",
+    "./datasets/Aspirational Districts in India.xlsx",
+]
+data_hash = hashlib.sha1()
+for a_file in data_files:
+    with open(a_file, "rb") as data_read:
+        data_hash.update(data_read.read())
+data_version = data_hash.hexdigest()[:16]
+
 
 # %%
 # write output file to DBFS
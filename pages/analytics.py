@@ -0,0 +1,249 @@
+from collections import namedtuple
+import time
+import warnings
+
+import numpy as np
+
+# %%
+# simple linear regression y = intercept + slope * x per group (integer codes
+# 0..n_groups - 1) in one pass: closed-form least squares on grouped sums with
+# bincount, pairs with a missing value dropped; the fitted line spans each
+# group's x range; NaN for groups with fewer than two pairs or constant x
+GroupedOLSFit = namedtuple(
+    "GroupedOLSFit", ["slope", "intercept", "r_squared", "n_obs", "x_min", "x_max"]
+)
+
+
+def grouped_ols_fit(x, y, codes, n_groups):
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y, codes = x[valid], y[valid], np.asarray(codes)[valid]
+
+    n_obs = np.bincount(codes, minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_mean = np.bincount(codes, x, n_groups) / n_obs
+        y_mean = np.bincount(codes, y, n_groups) / n_obs
+        x_dev = x - x_mean[codes]
+        y_dev = y - y_mean[codes]
+        sxx = np.bincount(codes, x_dev * x_dev, n_groups)
+        sxy = np.bincount(codes, x_dev * y_dev, n_groups)
+        syy = np.bincount(codes, y_dev * y_dev, n_groups)
+
+        slope = sxy / sxx
+        intercept = y_mean - slope * x_mean
+        r_squared = sxy * sxy / (sxx * syy)
+    undefined = (n_obs < 2) | (sxx == 0)
+    slope[undefined] = np.nan
+    intercept[undefined] = np.nan
+    r_squared[undefined | (syy == 0)] = np.nan
+
+    x_min = np.full(n_groups, np.inf)
+    x_max = np.full(n_groups, -np.inf)
+    np.minimum.at(x_min, codes, x)
+    np.maximum.at(x_max, codes, x)
+    x_min[n_obs == 0] = np.nan
+    x_max[n_obs == 0] = np.nan
+    return GroupedOLSFit(slope, intercept, r_squared, n_obs, x_min, x_max)
+
+
+# %%
+# pearson correlation of every pair of columns over the rows where both are
+# present (pairwise-complete), as matrix products; NaN below min_obs pairs
+# or for a constant column
+def pairwise_correlation(values, min_obs=3):
+    present = (~np.isnan(values)).astype("float64")
+    # centred on the column means first (precision of the one-pass sums)
+    means = np.nansum(values, axis=0) / np.maximum(present.sum(axis=0), 1)
+    filled = np.where(present > 0, values - means, 0.0)
+
+    # per pair (i, j): count, sums of column i over rows where j is present
+    n_obs = present.T @ present
+    sums = filled.T @ present
+    sums_sq = (filled * filled).T @ present
+    cross = filled.T @ filled
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = cross - sums * sums.T / n_obs
+        var = sums_sq - sums * sums / n_obs
+        corr = cov / np.sqrt(var * var.T)
+    corr[(n_obs < min_obs) | ~np.isfinite(corr)] = np.nan
+    return np.clip(corr, -1, 1)
+
+
+# symmetric matrix as its packed upper triangle (diagonal excluded, float32)
+def upper_triangle(matrix):
+    return matrix[np.triu_indices(len(matrix), 1)].astype("float32")
+
+
+# row i of the packed k x k matrix: other column positions and their values
+def packed_row(packed, i, k):
+    others = np.delete(np.arange(k), i)
+    low, high = np.minimum(others, i), np.maximum(others, i)
+    return others, packed[low * k - low * (low + 1) // 2 + high - low - 1]
+
+
+# %%
+# columns to zero mean and unit variance over the rows where present (missing
+# values stay NaN, constant or empty columns become NaN)
+def standardize_columns(values):
+    present = ~np.isnan(values)
+    n_obs = np.maximum(present.sum(axis=0), 1)
+    centred = values - np.nansum(values, axis=0) / n_obs
+    std = np.sqrt(np.nansum(centred * centred, axis=0) / n_obs)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scaled = centred / std
+    scaled[:, std == 0] = np.nan
+    return scaled
+
+
+# root mean squared difference of each pair of rows over the columns present
+# in both, as matrix products; NaN below min_shared shared columns
+def pairwise_distance(values, min_shared=10):
+    present = (~np.isnan(values)).astype("float64")
+    filled = np.where(present > 0, values, 0.0)
+
+    # per pair (i, j): sum over shared columns of a^2 + b^2 - 2ab
+    n_shared = present @ present.T
+    squares = (filled * filled) @ present.T
+    sum_sq = squares + squares.T - 2 * filled @ filled.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        distance = np.sqrt(np.maximum(sum_sq, 0) / n_shared)
+    distance[n_shared < min_shared] = np.nan
+    return distance, n_shared.astype("int32")
+
+
+# k nearest rows of every row (self excluded), nearest first: positions (-1
+# when fewer rows share enough columns), distance and shared columns
+NearestRows = namedtuple("NearestRows", ["rows", "distance", "n_shared"])
+
+
+def nearest_rows(values, k, min_shared=10):
+    distance, n_shared = pairwise_distance(values, min_shared)
+    np.fill_diagonal(distance, np.nan)
+    k = min(k, len(values) - 1)
+    # missing distances last, then the k smallest sorted (ties by position)
+    ranked = np.where(np.isnan(distance), np.inf, distance)
+    rows = np.argpartition(ranked, k, axis=1)[:, :k]
+    rows = np.take_along_axis(
+        rows, np.lexsort((rows, np.take_along_axis(ranked, rows, 1))), 1
+    )
+    distance = np.take_along_axis(distance, rows, 1).astype("float32")
+    n_shared = np.take_along_axis(n_shared, rows, 1)
+    rows[np.isnan(distance)] = -1
+    return NearestRows(rows.astype("int32"), distance, n_shared)
+
+
+# %%
+# k-means: cluster per row (-1: not clustered), centres, within-cluster sum of
+# squares, iterations run and whether the assignment settled
+KMeansFit = namedtuple(
+    "KMeansFit", ["labels", "centers", "inertia", "n_iter", "converged"]
+)
+
+
+# squared euclidean distance of every row to every centre
+def squared_distances(values, centers):
+    return (
+        (values * values).sum(axis=1)[:, None]
+        - 2 * values @ centers.T
+        + (centers * centers).sum(axis=1)
+    )
+
+
+# k-means++ seeding, then Lloyd iterations until the assignment settles or the
+# time budget (seconds) runs out; rows with a missing value are not clustered,
+# clusters numbered by size (0: largest), seeded (same input, same clusters)
+def kmeans(values, k, time_budget, max_iter=100, seed=0):
+    deadline = time.perf_counter() + time_budget
+    complete = ~np.isnan(values).any(axis=1)
+    points = values[complete]
+    labels = np.full(len(values), -1)
+    if not len(points) or k < 1:
+        return KMeansFit(labels, np.empty((0, values.shape[1])), np.nan, 0, False)
+
+    rng = np.random.default_rng(seed)
+    centers = points[[rng.integers(len(points))]]
+    while len(centers) < min(k, len(points)):
+        nearest = squared_distances(points, centers).min(axis=1).clip(0)
+        # fewer distinct rows than clusters
+        if not nearest.sum():
+            break
+        centers = np.vstack(
+            [centers, points[rng.choice(len(points), p=nearest / nearest.sum())]]
+        )
+
+    point_labels = squared_distances(points, centers).argmin(axis=1)
+    n_iter, converged = 0, False
+    while n_iter < max_iter and time.perf_counter() < deadline:
+        # centres as member means (one-hot product), empty clusters stay put
+        members = point_labels[:, None] == np.arange(len(centers))
+        counts = members.sum(axis=0)
+        centers = np.where(
+            counts[:, None] > 0,
+            members.T @ points / np.maximum(counts, 1)[:, None],
+            centers,
+        )
+        n_iter += 1
+        new_labels = squared_distances(points, centers).argmin(axis=1)
+        if (new_labels == point_labels).all():
+            converged = True
+            break
+        point_labels = new_labels
+
+    counts = np.bincount(point_labels, minlength=len(centers))
+    order = np.argsort(-counts, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    labels[complete] = rank[point_labels]
+    inertia = (
+        squared_distances(points, centers)[np.arange(len(points)), point_labels]
+        .clip(0)
+        .sum()
+    )
+    return KMeansFit(labels, centers[order], inertia, n_iter, converged)
+
+
+# %%
+# columns to [0, 1] over the rows where present (constant or empty: NaN)
+def min_max_columns(values):
+    present = ~np.isnan(values)
+    low = np.where(present, values, np.inf).min(axis=0)
+    span = np.where(present, values, -np.inf).max(axis=0) - low
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(span > 0, (values - low) / span, np.nan)
+
+
+# weighted mean of normalized columns per row in one matrix product, columns
+# with direction -1 flipped (lower is better); over the reported columns,
+# NaN below min_weight_share of the total weight reported
+def composite_index(
+    values, weights, directions, normalization="minmax", min_weight_share=0.5
+):
+    weights = np.asarray(weights, dtype="float64")
+    directions = np.asarray(directions)
+    if normalization == "minmax":
+        normalized = min_max_columns(values)
+        normalized = np.where(directions < 0, 1 - normalized, normalized)
+    else:
+        normalized = standardize_columns(values) * directions
+
+    present = ~np.isnan(normalized)
+    reported_weight = present @ weights
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = np.where(present, normalized, 0) @ weights / reported_weight
+    scores[reported_weight < min_weight_share * weights.sum()] = np.nan
+    return scores
+
+
+# %%
+# class of every value by the quantiles of its column over reference rows, all
+# columns at once (0: lowest, n_classes - 1: highest, -1: missing)
+def quantile_classes(values, reference, n_classes=3):
+    with warnings.catch_warnings():
+        # columns without reference values: every value missing or class 0
+        warnings.simplefilter("ignore", RuntimeWarning)
+        edges = np.nanquantile(reference, np.arange(1, n_classes) / n_classes, axis=0)
+    classes = (values[:, None, :] > edges).sum(axis=1)
+    classes[np.isnan(values)] = -1
+    return classes
@@ -0,0 +1,148 @@
+import csv
+import glob
+import hashlib
+import os
+import re
+
+from flask import Blueprint, abort, request, send_file
+import numpy as np
+import xlsxwriter
+
+from . import (
+    data_version,
+    nfhs_dist_ind_df,
+    district_kpi_pos,
+    district_round_values,
+    district_change_values,
+    district_states,
+    district_names,
+    scope_selected_rows,
+)
+from .response_cache import cache_dir
+
+# %%
+# pre-generated exports: one file per scope x domain x format (data version)
+export_dir = os.path.join(cache_dir, "exports")
+export_formats = ["csv", "xlsx"]
+# domain value for the whole district dataset
+export_all_domains = "All"
+export_header = [
+    "State",
+    "District",
+    "Domain",
+    "Indicator",
+    "NFHS-4",
+    "NFHS-5",
+    "Abs. Change",
+]
+
+# indicators by domain (dataset order)
+export_domain_kpis = {
+    export_all_domains: list(nfhs_dist_ind_df.district_kpi),
+    **{
+        domain: list(kpis)
+        for domain, kpis in nfhs_dist_ind_df.groupby(
+            "ind_domain", sort=False
+        ).district_kpi
+    },
+}
+kpi_domain_map = dict(zip(nfhs_dist_ind_df.district_kpi, nfhs_dist_ind_df.ind_domain))
+
+
+# %%
+# file in the export directory and download name
+def export_path(scope, domain, file_format):
+    export_id = hashlib.sha1(f"{scope}\n{domain}".encode()).hexdigest()[:16]
+    return os.path.join(export_dir, f"{data_version}-{export_id}.{file_format}")
+
+
+def export_filename(scope, domain, file_format):
+    slug = re.sub(r"\W+", "_", f"{scope} {domain}").strip("_")
+    return f"NFHS_4_5_{slug}.{file_format}"
+
+
+# rows of one indicator at a time (districts with a value in either round)
+def export_chunks(scope, domain):
+    rows = scope_selected_rows[scope]
+    states = district_states[rows]
+    names = district_names[rows]
+    for kpi in export_domain_kpis[domain]:
+        kpi_col = district_kpi_pos[kpi]
+        nfhs_4 = district_round_values["NFHS-4"][rows, kpi_col].round(2)
+        nfhs_5 = district_round_values["NFHS-5"][rows, kpi_col].round(2)
+        change = district_change_values[rows, kpi_col].round(2)
+        kpi_domain = kpi_domain_map[kpi]
+        keep = np.flatnonzero(~(np.isnan(nfhs_4) & np.isnan(nfhs_5)))
+        values = np.column_stack([nfhs_4, nfhs_5, change])[keep]
+        # empty cells for missing values
+        cells = values.astype(object)
+        cells[np.isnan(values)] = None
+        yield [
+            [states[i], names[i], kpi_domain, kpi, *row]
+            for i, row in zip(keep, cells.tolist())
+        ]
+
+
+# write chunk by chunk (xlsx in constant memory mode), then move into place
+def write_export(scope, domain, file_format):
+    path = export_path(scope, domain, file_format)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if file_format == "csv":
+        with open(tmp_path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+            writer.writerow(export_header)
+            for chunk in export_chunks(scope, domain):
+                writer.writerows(chunk)
+    else:
+        workbook = xlsxwriter.Workbook(tmp_path, {"constant_memory": True})
+        worksheet = workbook.add_worksheet("NFHS 4-5 districts")
+        worksheet.write_row(0, 0, export_header)
+        row_num = 1
+        for chunk in export_chunks(scope, domain):
+            for row in chunk:
+                worksheet.write_row(row_num, 0, row)
+                row_num += 1
+        workbook.close()
+    os.replace(tmp_path, path)
+    return path
+
+
+# existing file, else generated on first request
+def get_export(scope, domain, file_format):
+    path = export_path(scope, domain, file_format)
+    if not os.path.exists(path):
+        write_export(scope, domain, file_format)
+    return path
+
+
+# exports of previous data versions
+def remove_stale_exports():
+    for path in glob.glob(os.path.join(export_dir, "*")):
+        if not os.path.basename(path).startswith(f"{data_version}-"):
+            os.remove(path)
+
+
+os.makedirs(export_dir, exist_ok=True)
+
+# %%
+# flask route: files are streamed from disk (not through a dash callback)
+export_blueprint = Blueprint("exports", __name__)
+
+
+@export_blueprint.route("/exports/district")
+def download_export():
+    scope = request.args.get("scope", "All India")
+    domain = request.args.get("domain", export_all_domains)
+    file_format = request.args.get("format", "csv")
+    if (
+        scope not in scope_selected_rows
+        or domain not in export_domain_kpis
+        or file_format not in export_formats
+    ):
+        abort(404)
+    return send_file(
+        get_export(scope, domain, file_format),
+        as_attachment=True,
+        download_name=export_filename(scope, domain, file_format),
+        conditional=True,
+    )
@@ -0,0 +1,85 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .response_cache import (
+    cache_dir,
+    cached_functions,
+    disk_cache,
+    popularity,
+    response_cache,
+    serialize_outputs,
+)
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# %%
+# warm set size, share of one core spent warming and refresh period (seconds)
+warm_top_n = int(os.environ.get("NFHS_WARM_TOP_N", 200))
+warm_cpu_budget = float(os.environ.get("NFHS_WARM_CPU_BUDGET", 0.25))
+warm_interval = float(os.environ.get("NFHS_WARM_INTERVAL", 600))
+logger = logging.getLogger(__name__)
+
+
+# %%
+# recompute the most requested entries missing from the shared cache
+def warm_cache(top_n, cpu_budget):
+    popularity.flush()
+    try:
+        top_requests = disk_cache.top_requests(top_n)
+    except sqlite3.Error as error:
+        # locked or corrupt shared cache: keep the thread, retry next refresh
+        logger.warning("cache warmer: reading request counts failed: %s", error)
+        return 0
+    warmed = 0
+    for key, name, args in top_requests:
+        func = cached_functions.get(name)
+        if func is None or disk_cache.contains(key):
+            continue
+        start = time.perf_counter()
+        try:
+            payload = serialize_outputs(func(*args))
+        except Exception:
+            # stale inputs (e.g. renamed indicator) or outputs not to store
+            # (UncachedOutputs): skip, do not stop warming
+            continue
+        disk_cache.put(key, payload)
+        response_cache.put(key, payload)
+        warmed += 1
+        # cpu budget: idle in proportion to the time spent computing
+        elapsed = time.perf_counter() - start
+        time.sleep(elapsed * (1 - cpu_budget) / cpu_budget)
+    return warmed
+
+
+def warmer_loop(top_n, cpu_budget, interval):
+    # single warmer per host: results land in the shared cache for all workers
+    if fcntl is not None:
+        lock_file = open(os.path.join(cache_dir, "warmer.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return
+    while True:
+        warm_cache(top_n, cpu_budget)
+        time.sleep(interval)
+
+
+# start at worker start-up (and so after every data reload/deploy)
+def start_cache_warmer():
+    if warm_top_n <= 0 or warm_cpu_budget <= 0:
+        return None
+    warmer = threading.Thread(
+        target=warmer_loop,
+        args=(warm_top_n, min(warm_cpu_budget, 1.0), warm_interval),
+        name="cache-warmer",
+        daemon=True,
+    )
+    warmer.start()
+    return warmer
@@ -0,0 +1,95 @@
+import gzip
+import hashlib
+import os
+
+from flask import request
+
+from .response_cache import cache_dir
+
+# %%
+# gzip of dynamic responses: minimum size (bytes) and level (low: latency)
+compress_min_bytes = int(os.environ.get("NFHS_COMPRESS_MIN_BYTES", 1024))
+compress_level = int(os.environ.get("NFHS_COMPRESS_LEVEL", 4))
+# static files: compressed once at the highest level, kept on disk
+static_gzip_dir = os.path.join(cache_dir, "static")
+static_gzip_level = 9
+
+# dash callback and api responses (compressed per request)
+dynamic_paths = ("/_dash-update-component", "/_dash-layout", "/_dash-dependencies")
+dynamic_prefixes = ("/api/v1/",)
+# dash renderer/component bundles and assets (compressed once)
+static_prefixes = ("/_dash-component-suites/", "/assets/")
+compressible_mimetypes = (
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+    "text/css",
+    "text/javascript",
+)
+
+# precompressed static payloads by path and etag (per worker)
+static_gzip_cache = {}
+
+
+# %%
+def gzip_response(response, payload):
+    response.set_data(payload)
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+# static file: memory, else the precompressed file on disk, else compress it
+# (None: file too small to be worth it)
+def static_gzip(response):
+    key = request.path + (response.get_etag()[0] or "")
+    if key in static_gzip_cache:
+        return static_gzip_cache[key]
+    path = os.path.join(static_gzip_dir, hashlib.sha1(key.encode()).hexdigest() + ".gz")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            payload = f.read()
+    else:
+        # file responses stream from disk: read them to compress
+        response.direct_passthrough = False
+        data = response.get_data()
+        payload = (
+            gzip.compress(data, static_gzip_level, mtime=0)
+            if len(data) >= compress_min_bytes
+            else None
+        )
+        if payload is not None:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+    static_gzip_cache[key] = payload
+    return payload
+
+
+# flask after_request: gzip large responses for clients accepting it
+def compress_response(response):
+    if (
+        response.status_code != 200
+        or "Content-Encoding" in response.headers
+        or "gzip" not in request.headers.get("Accept-Encoding", "")
+    ):
+        return response
+
+    path = request.path
+    if path.endswith(dynamic_paths) or path.startswith(dynamic_prefixes):
+        payload = response.get_data()
+        if len(payload) >= compress_min_bytes:
+            gzip_response(response, gzip.compress(payload, compress_level))
+    elif (
+        any(prefix in path for prefix in static_prefixes)
+        and response.mimetype in compressible_mimetypes
+    ):
+        payload = static_gzip(response)
+        if payload is not None:
+            response.direct_passthrough = False
+            gzip_response(response, payload)
+    return response
+
+
+os.makedirs(static_gzip_dir, exist_ok=True)
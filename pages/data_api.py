@@ -0,0 +1,225 @@
+import hashlib
+import json
+
+from flask import Blueprint, Response, jsonify, request
+import numpy as np
+
+from . import (
+    data_version,
+    df_nfhs_345,
+    df_equity,
+    nfhs_dist_ind_df,
+    district_kpi_pos,
+    district_round_values,
+    district_change_values,
+    district_states,
+    district_names,
+    district_index_df,
+    district_neighbours,
+    similar_districts_max,
+    scope_selected_rows,
+)
+
+# %%
+# read-only data api: compact columnar json, validated by the data version
+api_blueprint = Blueprint("data_api", __name__, url_prefix="/api/v1")
+# clients must revalidate (cheap 304 while the data snapshot is unchanged)
+api_cache_control = "public, no-cache"
+
+# district matrices by round (change: NFHS-5 minus NFHS-4)
+api_district_rounds = {**district_round_values, "change": district_change_values}
+
+# state series and equity rows (filter columns first)
+api_state_columns = [
+    "State",
+    "Indicator Type",
+    "Indicator",
+    "Gender",
+    "NFHS",
+    "Year (give as a period)",
+    "Urban",
+    "Rural",
+    "Total",
+]
+api_state_df = df_nfhs_345[api_state_columns].rename(
+    columns={"Year (give as a period)": "Year"}
+)
+api_equity_df = df_equity[
+    [
+        "State",
+        "Year",
+        "Indicator",
+        *df_equity.columns.drop(["State", "Year", "Indicator"]),
+    ]
+]
+
+
+# %%
+# strong etag: data snapshot + endpoint + query (order of arguments ignored)
+def api_etag():
+    query = sorted(request.args.items(multi=True))
+    return hashlib.sha1(
+        json.dumps([data_version, request.path, query]).encode()
+    ).hexdigest()
+
+
+# answer 304 when the client holds the current version, else build the body
+def conditional_json(build_body):
+    etag = api_etag()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        body = build_body()
+        if isinstance(body, Response):
+            return body
+        response = Response(
+            json.dumps({"data_version": data_version, **body}, separators=(",", ":")),
+            mimetype="application/json",
+        )
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = api_cache_control
+    return response
+
+
+def api_error(message):
+    response = jsonify(error=message)
+    response.status_code = 400
+    return response
+
+
+# frame as {column: [values]} with missing values as null
+def frame_columns(frame):
+    return {
+        col: frame[col].astype(object).where(frame[col].notna(), None).tolist()
+        for col in frame.columns
+    }
+
+
+def array_column(values):
+    column = values.astype(object)
+    column[np.isnan(values)] = None
+    return column.tolist()
+
+
+# filter a frame by the repeatable query arguments (column: argument)
+def filter_frame(frame, filters):
+    mask = np.ones(len(frame), dtype=bool)
+    for col, arg in filters.items():
+        selected = request.args.getlist(arg)
+        if selected:
+            mask &= frame[col].isin(selected).to_numpy()
+    return frame.loc[mask]
+
+
+# %%
+# district indicators and their domains
+@api_blueprint.route("/indicators")
+def api_indicators():
+    return conditional_json(
+        lambda: {
+            "columns": {
+                "Domain": nfhs_dist_ind_df.ind_domain.tolist(),
+                "Indicator": nfhs_dist_ind_df.district_kpi.tolist(),
+            }
+        }
+    )
+
+
+# district values: ?indicator=...(repeatable)&scope=All India&round=NFHS-5
+@api_blueprint.route("/districts")
+def api_districts():
+    def build_body():
+        indicators = request.args.getlist("indicator")
+        scope = request.args.get("scope", "All India")
+        nfhs_round = request.args.get("round", "NFHS-5")
+        unknown = [kpi for kpi in indicators if kpi not in district_kpi_pos]
+        if not indicators or unknown:
+            return api_error(f"unknown or missing indicator: {unknown}")
+        if scope not in scope_selected_rows:
+            return api_error(f"unknown scope: {scope}")
+        if nfhs_round not in api_district_rounds:
+            return api_error(f"round must be one of {list(api_district_rounds)}")
+
+        rows = scope_selected_rows[scope]
+        kpi_cols = [district_kpi_pos[kpi] for kpi in indicators]
+        # two decimals as reported (change: drop float noise)
+        values = api_district_rounds[nfhs_round][np.ix_(rows, kpi_cols)].round(2)
+        return {
+            "scope": scope,
+            "round": nfhs_round,
+            "columns": {
+                "State": district_states[rows].tolist(),
+                "District": district_names[rows].tolist(),
+                **{kpi: array_column(values[:, j]) for j, kpi in enumerate(indicators)},
+            },
+        }
+
+    return conditional_json(build_body)
+
+
+# state series: ?state=&indicator=&nfhs= (all repeatable, optional)
+@api_blueprint.route("/states")
+def api_states():
+    return conditional_json(
+        lambda: {
+            "columns": frame_columns(
+                filter_frame(
+                    api_state_df,
+                    {"State": "state", "Indicator": "indicator", "NFHS": "nfhs"},
+                )
+            )
+        }
+    )
+
+
+# equity rows: ?state=&year=&indicator= (all repeatable, optional)
+@api_blueprint.route("/equity")
+def api_equity():
+    return conditional_json(
+        lambda: {
+            "columns": frame_columns(
+                filter_frame(
+                    api_equity_df,
+                    {"State": "state", "Year": "year", "Indicator": "indicator"},
+                )
+            )
+        }
+    )
+
+
+# districts most like one: ?state=&district=&profile=NFHS-5&k=10 (nearest
+# first, precomputed k-nn over standardized profiles)
+@api_blueprint.route("/similar")
+def api_similar():
+    def build_body():
+        state = request.args.get("state")
+        district = request.args.get("district")
+        profile = request.args.get("profile", "NFHS-5")
+        similar_k = request.args.get("k", "10")
+        row = district_index_df.index.get_indexer([(state, district)])[0]
+        if row < 0:
+            return api_error(f"unknown district: {district}, {state}")
+        if profile not in district_neighbours:
+            return api_error(f"profile must be one of {list(district_neighbours)}")
+        if not similar_k.isdigit() or not 0 < int(similar_k) <= similar_districts_max:
+            return api_error(f"k must be between 1 and {similar_districts_max}")
+
+        neighbours = district_neighbours[profile]
+        rows = neighbours.rows[row, : int(similar_k)]
+        found = rows >= 0
+        return {
+            "state": state,
+            "district": district,
+            "profile": profile,
+            "columns": {
+                "State": district_states[rows[found]].tolist(),
+                "District": district_names[rows[found]].tolist(),
+                "Distance": neighbours.distance[row, : found.size][found]
+                .astype("float64")
+                .round(4)
+                .tolist(),
+                "Shared": neighbours.n_shared[row, : found.size][found].tolist(),
+            },
+        }
+
+    return conditional_json(build_body)
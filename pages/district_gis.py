@@ -1,25 +1,74 @@
 import csv
-from dash import callback, dcc, html, Input, Output, State, register_page
+import functools
+import hashlib
+import json
+import math
+import os
+from urllib.parse import urlencode, urljoin
+from dash import (
+    callback,
+    ctx,
+    dcc,
+    get_relative_path,
+    html,
+    Input,
+    Output,
+    State,
+    register_page,
+)
 from dash.dash_table import DataTable, FormatTemplate, Format
 import dash_bootstrap_components as dbc
+from flask import request
 import numpy as np
 import pandas as pd
-import plotly.express as px
 import re
 
 from . import (
+    data_version,
     state_options,
     label_no_fig,
-    district_map_df,
-    geo_dict,
-    district_geo_dict,
-    geo_json_dict,
     df_nfhs_345,
     ind_dom_dist_options,
+    district_map_options,
     nfhs_dist_ind_df,
     district_state_match,
     dist_state_kpi_df,
-    aspir_dist_df,
+    district_kpi_pos,
+    district_round_values,
+    district_change_values,
+    district_geo_keys,
+    district_states,
+    district_names,
+    district_sorted_rows,
+    district_wide_pos,
+    district_wide_scaled,
+    district_wide_values,
+    district_profiles,
+    district_neighbours,
+    scope_geo_rows,
+    scope_selected_rows,
+    scope_unselected_pos,
+    scope_missing_pos,
+)
+from .analytics import composite_index, kmeans, quantile_classes
+from .figure_factory import (
+    animated_figure,
+    bivariate_figure,
+    choropleth_figure,
+    cluster_colors,
+    cluster_figure,
+    district_point_marker,
+    tile_map_figure,
+)
+from .bulk_export import export_all_domains, export_formats
+from .response_cache import UncachedOutputs, cached_callback
+from .result_store import result_store
+from .vector_tiles import (
+    district_lat,
+    district_lon,
+    scope_map_view,
+    tile_max_zoom,
+    tile_min_zoom,
 )
 
 register_page(__name__, path="/district-gis", title="District GIS")
@@ -56,6 +105,24 @@ dd_kpi_map_district = dbc.Select(
     style={"fontSize": "12px"},
 )
 
+# dbc selects: second indicator of the bivariate map (y axis)
+dd_domain_bivar = dbc.Select(
+    id="kpi-domain-bivar-dd",
+    size="sm",
+    options=ind_dom_dist_options,
+    value=ind_dom_dist_options[0]["value"],
+    persistence=True,
+    persistence_type="session",
+    style={"fontSize": "12px"},
+)
+dd_kpi_bivar = dbc.Select(
+    id="kpi-bivar-dd",
+    size="sm",
+    persistence=True,
+    persistence_type="session",
+    style={"fontSize": "12px"},
+)
+
 # %%
 # dbc ButtonGroup with RadioItems
 button_group_change = html.Div(
@@ -69,6 +136,8 @@ button_group_change = html.Div(
             options=[
                 {"label": "NFHS-5", "value": "value"},
                 {"label": "Change (2016-21)", "value": "Abs_Change"},
+                {"label": "NFHS-4 \u2192 NFHS-5", "value": "animate"},
+                {"label": "Bivariate", "value": "bivariate"},
             ],
             value="value",
             persistence=True,
@@ -78,6 +147,27 @@ button_group_change = html.Div(
     className="radio-group",
 )
 
+# dbc ButtonGroup with RadioItems: map rendering (geojson or local tiles)
+button_group_map_mode = html.Div(
+    [
+        dbc.RadioItems(
+            id="radios-map-mode",
+            className="btn-group",
+            inputClassName="btn-check",
+            labelClassName="btn btn-outline-info",
+            labelCheckedClassName="active",
+            options=[
+                {"label": "Choropleth", "value": "choropleth"},
+                {"label": "Tiles", "value": "tiles"},
+            ],
+            value="choropleth",
+            persistence=True,
+            persistence_type="session",
+        ),
+    ],
+    className="radio-group",
+)
+
 # %%
 # dbc button: download datatable
 bt_dwd = dbc.Button(
@@ -94,6 +184,201 @@ bt_dwd = dbc.Button(
     color="info",
 )
 
+# %%
+# dbc selects + link button: bulk export of the selection (pre-generated file)
+dd_export_content = dbc.Select(
+    id="export-content-dd",
+    size="sm",
+    options=[
+        {"label": "All Indicators in Domain", "value": "domain"},
+        {"label": "All Indicators (all domains)", "value": export_all_domains},
+    ],
+    value="domain",
+    persistence=True,
+    persistence_type="session",
+    style={"fontSize": "12px"},
+)
+dd_export_format = dbc.Select(
+    id="export-format-dd",
+    size="sm",
+    options=[{"label": l.upper(), "value": l} for l in export_formats],
+    value=export_formats[0],
+    persistence=True,
+    persistence_type="session",
+    style={"fontSize": "12px"},
+)
+bt_export = dbc.Button(
+    html.P(
+        "Bulk Export",
+        style={
+            "margin-top": "12px",
+            "fontWeight": "bold",
+        },
+    ),
+    id="btn-export",
+    class_name="me-1",
+    outline=True,
+    color="info",
+    external_link=True,
+)
+
+# %%
+# dbc select + radios: districts like the selected one (precomputed k-nn)
+dd_similar_district = dbc.Select(
+    id="similar-district-dd",
+    size="sm",
+    persistence=True,
+    persistence_type="session",
+    style={"fontSize": "12px"},
+)
+button_group_similar = html.Div(
+    [
+        dbc.RadioItems(
+            id="radios-similar-profile",
+            className="btn-group",
+            inputClassName="btn-check",
+            labelClassName="btn btn-outline-info",
+            labelCheckedClassName="active",
+            options=[{"label": l, "value": l} for l in district_profiles],
+            value="NFHS-5",
+            persistence=True,
+            persistence_type="session",
+        ),
+    ],
+    className="radio-group",
+)
+dd_similar_k = dbc.Select(
+    id="similar-k-dd",
+    size="sm",
+    options=[{"label": f"{k} Districts", "value": str(k)} for k in [5, 10, 20, 50]],
+    value="10",
+    persistence=True,
+    persistence_type="session",
+    style={"fontSize": "12px"},
+)
+
+# %%
+# dash dropdown (multi) + dbc selects: district clusters on chosen indicators
+dd_cluster_kpis = dcc.Dropdown(
+    id="cluster-kpis-dd",
+    options=district_map_options,
+    value=sorted(
+        nfhs_dist_ind_df.district_kpi[
+            nfhs_dist_ind_df.ind_domain == ind_dom_dist_options[0]["value"]
+        ],
+        key=str.lower,
+    ),
+    multi=True,
+    placeholder="Indicators to cluster districts on",
+    persistence=True,
+    persistence_type="session",
+    style={"fontSize": "12px"},
+)
+dd_cluster_k = dbc.Select(
+    id="cluster-k-dd",
+    size="sm",
+    options=[{"label": f"{k} Clusters", "value": str(k)} for k in range(2, 11)],
+    value="4",
+    persistence=True,
+    persistence_type="session",
+    style={"fontSize": "12px"},
+)
+dd_cluster_round = dbc.Select(
+    id="cluster-round-dd",
+    size="sm",
+    options=[
+        {"label": "NFHS-5", "value": "NFHS-5"},
+        {"label": "NFHS-4", "value": "NFHS-4"},
+        {"label": "Change (2016-21)", "value": "NFHS-5 minus NFHS-4"},
+    ],
+    value="NFHS-5",
+    persistence=True,
+    persistence_type="session",
+    style={"fontSize": "12px"},
+)
+
+# k-means time budget (seconds): past it the clusters of the last iteration
+cluster_time_budget = float(os.environ.get("NFHS_CLUSTER_TIME_BUDGET", 0.25))
+# districts clustered when they report this share of the chosen indicators
+cluster_min_share = 0.5
+
+# %%
+# composite index builder: indicators, then weight and direction per indicator
+dd_composite_kpis = dcc.Dropdown(
+    id="composite-kpis-dd",
+    options=district_map_options,
+    multi=True,
+    placeholder="Indicators of the composite index",
+    persistence=True,
+    persistence_type="session",
+    style={"fontSize": "12px"},
+)
+composite_directions = {"Higher is better": 1, "Lower is better": -1}
+table_composite_spec = DataTable(
+    id="composite-spec-table",
+    columns=[
+        {"name": "Indicator", "id": "Indicator", "editable": False},
+        {"name": "Weight", "id": "Weight", "type": "numeric"},
+        {"name": "Direction", "id": "Direction", "presentation": "dropdown"},
+    ],
+    data=[],
+    editable=True,
+    dropdown={
+        "Direction": {
+            "options": [{"label": l, "value": l} for l in composite_directions],
+            "clearable": False,
+        }
+    },
+    style_cell={"whiteSpace": "normal", "textAlign": "left", "fontSize": "13px"},
+    style_cell_conditional=[
+        {"if": {"column_id": ["Weight", "Direction"]}, "width": "140px"},
+    ],
+)
+button_group_composite_norm = html.Div(
+    [
+        dbc.RadioItems(
+            id="radios-composite-norm",
+            className="btn-group",
+            inputClassName="btn-check",
+            labelClassName="btn btn-outline-info",
+            labelCheckedClassName="active",
+            options=[
+                {"label": "Min-Max", "value": "minmax"},
+                {"label": "Z-Score", "value": "zscore"},
+            ],
+            value="minmax",
+            persistence=True,
+            persistence_type="session",
+        ),
+    ],
+    className="radio-group",
+)
+dd_composite_round = dbc.Select(
+    id="composite-round-dd",
+    size="sm",
+    options=[{"label": l, "value": l} for l in ["NFHS-5", "NFHS-4"]],
+    value="NFHS-5",
+    persistence=True,
+    persistence_type="session",
+    style={"fontSize": "12px"},
+)
+bt_composite_dwd = dbc.Button(
+    html.P(
+        ["Download Index in ", html.Code("csv")],
+        style={
+            "margin-top": "12px",
+            "fontWeight": "bold",
+        },
+    ),
+    id="btn-composite-dwd",
+    class_name="me-1",
+    outline=True,
+    color="info",
+)
+
+# district table rows sent per page (server-side paging)
+table_page_size = 25
+
 # %%
 # function to return indicator options by domain (sets a value)
 @callback(
@@ -112,6 +397,27 @@ def update_district_kpi_options(indicator_domain):
     return [{"label": l, "value": l} for l in district_kpis], district_kpis[0]
 
 
+# second indicator of the bivariate map: same options by domain
+@callback(
+    Output("kpi-bivar-dd", "options"),
+    Output("kpi-bivar-dd", "value"),
+    Input("kpi-domain-bivar-dd", "value"),
+)
+def update_bivariate_kpi_options(indicator_domain):
+    return update_district_kpi_options(indicator_domain)
+
+
+# second indicator selects shown in the bivariate map only
+@callback(
+    Output("bivariate-controls", "style"),
+    Input("radios-change", "value"),
+)
+def toggle_bivariate_controls(value_or_change):
+    if value_or_change == "bivariate":
+        return {"display": "flex", "gap": "10px"}
+    return {"display": "none"}
+
+
 # function to return cards layout
 # dbc kpi card: https://www.nelsontang.com/blog/2020-07-02-dash-bootstrap-kpi-card/
 def create_card(card_title=None, card_num=1):
@@ -224,7 +530,18 @@ layout = dbc.Container(
                 dbc.Col(
                     html.Div(
                         [
-                            button_group_change,
+                            html.Div(
+                                [
+                                    button_group_change,
+                                    button_group_map_mode,
+                                    html.Div(
+                                        [dd_domain_bivar, dd_kpi_bivar],
+                                        id="bivariate-controls",
+                                        style={"display": "none"},
+                                    ),
+                                ],
+                                style={"display": "flex", "gap": "20px"},
+                            ),
                             dcc.Graph(id="district-or-state-plot", figure=label_no_fig),
                         ]
                     ),
@@ -245,6 +562,14 @@ layout = dbc.Container(
                         "paddingLeft": "50px",
                     },
                 ),
+                dbc.Col(
+                    [dd_export_content, dd_export_format],
+                    width="auto",
+                    style={
+                        "paddingLeft": "50px",
+                    },
+                ),
+                dbc.Col(bt_export, width="auto"),
             ],
             justify="center",
             align="center",
@@ -252,7 +577,17 @@ layout = dbc.Container(
         dbc.Row(
             dbc.Col(
                 html.Div(
-                    id="table-div", style={"maxHeight": "550px", "overflowY": "scroll"}
+                    # server-side paging/sorting/filtering: one page per request
+                    DataTable(
+                        id="district-table",
+                        page_action="custom",
+                        sort_action="custom",
+                        sort_mode="multi",
+                        filter_action="custom",
+                        page_current=0,
+                        page_size=table_page_size,
+                    ),
+                    id="table-div",
                 ),
                 id="table-col",
                 width="auto",
@@ -261,8 +596,94 @@ layout = dbc.Container(
             align="center",
             style={"paddingTop": "30px", "paddingBottom": "30px"},
         ),
-        # hidden div: share data table in Dash
-        html.Div(id="table-df", style={"display": "none"}),
+        dbc.Row(
+            [
+                dbc.Col(dd_similar_district, width=3),
+                dbc.Col(button_group_similar, width="auto"),
+                dbc.Col(dd_similar_k, width="auto"),
+            ],
+            justify="center",
+            align="center",
+        ),
+        dbc.Row(
+            dbc.Col(html.Div(id="similar-districts"), width=10),
+            justify="center",
+            style={"paddingTop": "20px", "paddingBottom": "30px"},
+        ),
+        dbc.Row(
+            [
+                dbc.Col(dd_cluster_kpis, width=6),
+                dbc.Col(dd_cluster_k, width="auto"),
+                dbc.Col(dd_cluster_round, width="auto"),
+            ],
+            justify="center",
+            align="center",
+        ),
+        dbc.Row(
+            dbc.Col(
+                dcc.Graph(id="district-cluster-plot", figure=label_no_fig),
+                width=10,
+            ),
+            justify="center",
+            style={"paddingTop": "20px"},
+        ),
+        dbc.Row(
+            dbc.Col(html.Div(id="cluster-summary"), width=10),
+            justify="center",
+            style={"paddingBottom": "30px"},
+        ),
+        dbc.Row(
+            [
+                dbc.Col(dd_composite_kpis, width=6),
+                dbc.Col(button_group_composite_norm, width="auto"),
+                dbc.Col(dd_composite_round, width="auto"),
+            ],
+            justify="center",
+            align="center",
+        ),
+        dbc.Row(
+            dbc.Col(table_composite_spec, width=8),
+            justify="center",
+            style={"paddingTop": "20px"},
+        ),
+        dbc.Row(
+            dbc.Col(
+                dcc.Graph(id="district-composite-plot", figure=label_no_fig),
+                width=10,
+            ),
+            justify="center",
+            style={"paddingTop": "20px"},
+        ),
+        dbc.Row(
+            [
+                dbc.Col(html.Div(id="composite-title"), width="auto"),
+                dbc.Col(
+                    [bt_composite_dwd, dcc.Download(id="composite-dwd")],
+                    width="auto",
+                ),
+            ],
+            justify="center",
+            align="center",
+        ),
+        dbc.Row(
+            dbc.Col(
+                DataTable(
+                    id="composite-table",
+                    sort_action="native",
+                    page_size=table_page_size,
+                    style_cell={
+                        "whiteSpace": "normal",
+                        "textAlign": "left",
+                        "fontSize": "13px",
+                    },
+                ),
+                width=8,
+            ),
+            justify="center",
+            style={"paddingTop": "20px", "paddingBottom": "30px"},
+        ),
+        # handle of the district table kept server-side (result store)
+        dcc.Store(id="table-df"),
         # hidden div: share data table in Dash
         html.Div(id="ind-dmn", style={"display": "none"}),
         # hidden div: share data table in Dash
@@ -273,74 +694,118 @@ layout = dbc.Container(
 )
 
 # %%
-# function to avoid figure display inline
-def update_cm_fig(cm_fig):
-    cm_fig.update_geos(fitbounds="locations", visible=False)
-    cm_fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0})
-    cm_fig.update_coloraxes(colorbar_len=0.85, colorbar_x=0.78)
-    cm_fig.update_traces(marker_line_color="Gainsboro", marker_line_width=0.5)
-    return cm_fig
-
-
-# customed px continous color scale: name
-color_scale_name = "Rainbow"
-color_names = eval(f"px.colors.sequential.{color_scale_name}")
-
-# customed color scale with color for NaNs
-color_nan = "Gray"
-customed_color_nan = [
-    [0, color_nan],
-    [0.001, color_nan],
-    [0.001, color_names[0]],
-]
-customed_color_rem = [
-    [(i + 1) / (len(color_names) - 1), a_color]
-    for i, a_color in enumerate(color_names[1:])
-]
-customed_color_scale = customed_color_nan + customed_color_rem
+# district matrix per map mode (NFHS-4: first frame of the animated map)
+district_mode_values = {
+    "value": district_round_values["NFHS-5"],
+    "Abs_Change": district_change_values,
+    "NFHS-4": district_round_values["NFHS-4"],
+}
+# animated modes: map mode per frame (frame names: rounds)
+map_frame_modes = {"animate": {"NFHS-4": "NFHS-4", "NFHS-5": "value"}}
+map_z_labels = {
+    "value": "NFHS-5 Value",
+    "Abs_Change": "NFHS (5-4) Change",
+    "animate": "NFHS Value",
+    "bivariate": "Bivariate Class",
+}
+# bivariate map: tertile names (low to high)
+bivariate_levels = ["Low", "Medium", "High"]
+# district boundaries resolution of the choropleths (geo_api level)
+map_geo_level = "full"
+
+
+# one entry per geometry: precomputed sentinel positions (not in selection
+# -500, not reported -1000)
+def district_map_arrays(mode_values, india_or_state, distr_kpi, value_mode):
+    geo_rows = scope_geo_rows[india_or_state]
+    unselected_pos = scope_unselected_pos[india_or_state]
+    missing_pos = scope_missing_pos[(india_or_state, distr_kpi, value_mode)]
+    map_values = mode_values[geo_rows]
+    map_values[unselected_pos] = -500
+    map_values[missing_pos] = -1000
+    map_notes = np.full(len(geo_rows), "Value Reported", dtype=object)
+    map_notes[unselected_pos] = "District NOT in Selection: (-500)"
+    map_notes[missing_pos] = "Value NOT Reported: (-1000)"
+    return map_values, map_notes
+
+
+# bivariate classes (NFHS-5): tertiles of both indicators over the selection,
+# class 3 * y tertile + x tertile (-1: not in selection or not reported)
+def bivariate_map_arrays(india_or_state, distr_kpi, distr_kpi_2):
+    geo_rows = scope_geo_rows[india_or_state]
+    kpi_cols = [district_kpi_pos[distr_kpi], district_kpi_pos[distr_kpi_2]]
+    values = district_round_values["NFHS-5"][:, kpi_cols]
+    classes = quantile_classes(
+        values[geo_rows], values[scope_selected_rows[india_or_state]]
+    )
+    map_values = np.where(
+        (classes >= 0).all(axis=1), 3 * classes[:, 1] + classes[:, 0], -1
+    )
+    map_notes = np.array(
+        [
+            f"X: {x:.1f} ({bivariate_levels[x_class]})<br>"
+            f"Y: {y:.1f} ({bivariate_levels[y_class]})"
+            for (x, y), (x_class, y_class) in zip(values[geo_rows], classes)
+        ],
+        dtype=object,
+    )
+    map_notes[map_values < 0] = "Value NOT Reported"
+    unselected_pos = scope_unselected_pos[india_or_state]
+    map_values[unselected_pos] = -1
+    map_notes[unselected_pos] = "District NOT in Selection"
+    return map_values, map_notes
 
 
+# boundaries by url (geo_api, cached by the browser): responses carry only
+# locations and values; programme scopes use the national map
+def scope_geojson(india_or_state):
+    scope = "All India" if "All India" in india_or_state else india_or_state
+    geo_query = urlencode({"state": scope, "level": map_geo_level})
+    return f"{get_relative_path('/geo/districts')}?{geo_query}"
+
+
+# %%
 @callback(
     Output("district-or-state-plot", "figure"),
     Output("card-tit-1", "children"),
     Output("card-val-1", "children"),
-    Output("table-div", "children"),
-    Output("table-df", "children"),
+    Output("district-table", "columns"),
+    Output("district-table", "page_current"),
     Output("ind-dmn", "children"),
     Output("ind-id", "children"),
     Input("india-or-state-dd", "value"),
     Input("kpi-district-map-dd", "value"),
     Input("radios-change", "value"),
+    Input("radios-map-mode", "value"),
+    Input("kpi-bivar-dd", "value"),
     State("kpi-domain-map-dd", "value"),
 )
+# second indicator only in the bivariate map (cache key of the other modes)
+def update_district_map(
+    india_or_state, distr_kpi, value_or_change, map_mode, distr_kpi_2, distr_dmn
+):
+    if value_or_change != "bivariate":
+        distr_kpi_2 = None
+    elif distr_kpi_2 not in district_kpi_pos:
+        value_or_change = "value"
+    outputs = disp_in_district_map(
+        india_or_state, distr_kpi, value_or_change, map_mode, distr_kpi_2, distr_dmn
+    )
+    if map_mode == "tiles":
+        # mapbox fetches tiles from a web worker: absolute urls on the request
+        # origin (cached figures keep the relative path)
+        for layer in outputs[0]["layout"]["mapbox"]["layers"]:
+            layer["source"] = [
+                urljoin(request.host_url, url) for url in layer["source"]
+            ]
+    return outputs
+
+
 # use dropdown values: update geo-json and indicator in map (district-wise)
-def disp_in_district_map(india_or_state, distr_kpi, value_or_change, distr_dmn):
-
-    # test if all_india
-    if "All India" in india_or_state:
-        display_df = district_map_df.query(
-            "variable == @distr_kpi & Round == 'NFHS-5'"
-        ).set_index(["State", "District name"])
-        display_df_4 = district_map_df.query(
-            "variable == @distr_kpi & Round == 'NFHS-4'"
-        ).set_index(["State", "District name"])
-        # do not filter geojson
-        geofile = geo_json_dict
-    else:
-        # query dataframe
-        display_df = district_map_df.query(
-            "State == @india_or_state & variable == @distr_kpi & Round == 'NFHS-5'"
-        ).set_index(["State", "District name"])
-        display_df_4 = district_map_df.query(
-            "State == @india_or_state & variable == @distr_kpi & Round == 'NFHS-4'"
-        ).set_index(["State", "District name"])
-        # filter geojson by state
-        geofile = {}
-        geofile["type"] = "FeatureCollection"
-        geofile["features"] = geo_dict[india_or_state]
-
-    # calculate change
-    display_df["Abs_Change"] = display_df.value - display_df_4.value
+@cached_callback("district-map")
+def disp_in_district_map(
+    india_or_state, distr_kpi, value_or_change, map_mode, distr_kpi_2, distr_dmn
+):
 
     # query state data
     matched_state = district_state_match.get(india_or_state, india_or_state)
@@ -355,172 +820,83 @@ def disp_in_district_map(india_or_state, distr_kpi, value_or_change, distr_dmn):
         ).Total.values
     )
 
-    # determine changes for dash table
-    pcnt_scale = 1 if re.findall(r"(\bsurveyed|interviewed\b)", distr_kpi) else 100
-    table_df = pd.concat(
-        [
-            display_df_4.value.rename("NFHS-4") / pcnt_scale,
-            display_df.value.rename("NFHS-5") / pcnt_scale,
-            display_df.Abs_Change.rename("Abs. Change") / pcnt_scale,
-        ],
-        axis=1,
-    )
-    table_df["Growth"] = table_df["Abs. Change"].apply(
-        lambda x: "" if pd.isna(x) else ("📈" if x > 0 else "📉")
-    )
+    geo_rows = scope_geo_rows[india_or_state]
+    if value_or_change == "bivariate":
+        # one frame: 3 x 3 classes of both indicators (colours by the figure)
+        frames = {"bivariate": "bivariate"}
+        frame_arrays = [bivariate_map_arrays(india_or_state, distr_kpi, distr_kpi_2)]
+        full_range = [None, None]
+    else:
+        # indicator column in the precomputed district matrices, one map frame per
+        # mode (animated: a frame per round, sharing the geometry)
+        kpi_col = district_kpi_pos[distr_kpi]
+        frames = map_frame_modes.get(
+            value_or_change, {value_or_change: value_or_change}
+        )
+        frame_modes = list(frames.values())
+        frame_values = [district_mode_values[mode][:, kpi_col] for mode in frame_modes]
 
-    # min-max block kpis - before setting missing as negatives
-    display_df["Note_NFHS5"] = np.nan
-    display_df["Note_Change"] = np.nan
-
-    # Hack aspirational districts selection
-    if re.findall(r"(?i)(\baspirational|gavi|laqshya\b)", india_or_state):
-        # districts in dataframe
-        dist_in_df = [",".join(elem) for elem in display_df.index]
-        # districts to display
-        dist_2_disp = aspir_dist_df[aspir_dist_df[india_or_state]].index
-        # districts to be dropped
-        dist_2_drop = np.setdiff1d(dist_in_df, dist_2_disp)
-        # districts to be added (not reported)
-        dist_2_add = np.setdiff1d(dist_2_disp, dist_in_df)
-        # drop in dataframe
-        display_df.drop(
-            index=[(a_tup.split(",")[0], a_tup.split(",")[1]) for a_tup in dist_2_drop],
-            inplace=True,
+        # set the range over the selection before adding the NA values (-1000)
+        range_values = np.concatenate(
+            [values[scope_selected_rows[india_or_state]] for values in frame_values]
         )
-        # set the range before adding the NA values (-1000)
-        full_range = [
-            display_df[value_or_change].min() - 0.5,
-            display_df[value_or_change].max(),
-        ]
-        display_df.loc[display_df.value.notna(), "Note_NFHS5"] = "Value Reported"
-        display_df.loc[
-            display_df.value.isnull(), "Note_NFHS5"
-        ] = "Value NOT Reported: (-1000)"
-        display_df.loc[display_df.value.isnull(), "value"] = -1000
-        display_df.loc[display_df.Abs_Change.notna(), "Note_Change"] = "Value Reported"
-        display_df.loc[
-            display_df.Abs_Change.isnull(), "Note_Change"
-        ] = "Value NOT Reported: (-1000)"
-        display_df.loc[display_df.Abs_Change.isnull(), "Abs_Change"] = -1000
-        # now add the non-reported
-        for a_tup in dist_2_add:
-            # add the geo name for these guys
-            display_df.loc[
-                (a_tup.split(",")[0], a_tup.split(",")[1]), "District_geo"
-            ] = (
-                district_geo_dict.get(india_or_state, district_geo_dict["All India"])
-                .query(
-                    "State == @a_tup.split(',')[0] & `District name` == @a_tup.split(',')[1]"
-                )
-                .District_geo.values[0]
-            )
-            display_df.loc[
-                (a_tup.split(",")[0], a_tup.split(",")[1]), value_or_change
-            ] = -1000
-            note_col = "Note_NFHS5" if value_or_change == "value" else "Note_Change"
-            display_df.loc[
-                (a_tup.split(",")[0], a_tup.split(",")[1]), note_col
-            ] = "Value NOT Reported: (-1000)"
-
-        # delete the non-aspirationals from data-table
-        table_df.drop(
-            index=[(a_tup.split(",")[0], a_tup.split(",")[1]) for a_tup in dist_2_drop],
-            inplace=True,
+        range_values = range_values[~np.isnan(range_values)]
+        full_range = (
+            [range_values.min() - 0.5, range_values.max()]
+            if range_values.size
+            else [None, None]
         )
-    else:
-        # set the range before adding the NA values (-1000)
-        full_range = [
-            display_df[value_or_change].min() - 0.5,
-            display_df[value_or_change].max(),
+
+        frame_arrays = [
+            district_map_arrays(values, india_or_state, distr_kpi, mode)
+            for values, mode in zip(frame_values, frame_modes)
         ]
-        display_df.loc[display_df.value.notna(), "Note_NFHS5"] = "Value Reported"
-        display_df.loc[
-            display_df.value.isnull(), "Note_NFHS5"
-        ] = "Value NOT Reported: (-1000)"
-        display_df.loc[display_df.value.isnull(), "value"] = -1000
-        display_df.loc[display_df.Abs_Change.notna(), "Note_Change"] = "Value Reported"
-        display_df.loc[
-            display_df.Abs_Change.isnull(), "Note_Change"
-        ] = "Value NOT Reported: (-1000)"
-        display_df.loc[display_df.Abs_Change.isnull(), "Abs_Change"] = -1000
-
-    display_df.reset_index(inplace=True)
-    # set missing reporting districts (or not selected)
-    not_reported_geo = np.setdiff1d(
-        district_geo_dict.get(india_or_state, district_geo_dict["All India"])[
-            "District_geo"
-        ].values,
-        display_df.query(f"{value_or_change}.notna()")["District_geo"].values,
-    )
-    # not_reported_geo = [
-    #     district_geo_dict.get(india_or_state, district_geo_dict["All India"])
-    #     .query("`District_geo` == @a_name")
-    #     .District_geo.values[0]
-    #     for a_name in not_reported
-    # ]
-    # concat not_reported as negatives
-    display_df = (
-        pd.concat(
-            [
-                display_df,
-                pd.DataFrame(
-                    {
-                        "District_geo": not_reported_geo,
-                        # "District_name": not_reported,
-                        "Note_NFHS5"
-                        if value_or_change == "value"
-                        else "Note_Change": [
-                            "District NOT in Selection: (-500)"
-                            if re.findall(
-                                r"(?i)(\baspirational|gavi|laqshya\b)", india_or_state
-                            )
-                            else "Value NOT Reported: (-1000)"
-                        ]
-                        * len(not_reported_geo),
-                    }
-                ),
-            ],
-            ignore_index=True,
+    map_values, map_notes = frame_arrays[0]
+
+    z_label = map_z_labels[value_or_change]
+    if map_mode == "tiles":
+        # tile map: boundaries from the local vector tiles (no geojson sent);
+        # values of every district of the scope still go as centroid markers
+        # (plotly mapbox layers take one fill colour, not feature properties)
+        cmap_fig = tile_map_figure(
+            get_relative_path(f"/tiles/{data_version}/districts/{{z}}/{{x}}/{{y}}.pbf"),
+            [tile_min_zoom, tile_max_zoom],
+            scope_map_view.get(
+                "All India" if "All India" in india_or_state else india_or_state,
+                scope_map_view["All India"],
+            ),
+            district_geo_keys[geo_rows],
+            district_lon[geo_rows],
+            district_lat[geo_rows],
+            map_values,
+            map_notes,
+            z_label,
+            full_range,
         )
-        .drop_duplicates(subset=["District_geo"], ignore_index=True)
-        .fillna(
-            {
-                value_or_change: -500
-                if re.findall(r"(?i)(\baspirational|gavi|laqshya\b)", india_or_state)
-                else -1000
-            }
+        frame_traces = [
+            {"marker": {"color": values, **district_point_marker}, "text": notes}
+            for values, notes in frame_arrays
+        ]
+    else:
+        # district map: prebuilt layout, arrays straight into the trace
+        cmap_fig = choropleth_figure(
+            scope_geojson(india_or_state),
+            district_geo_keys[geo_rows],
+            map_values,
+            map_notes,
+            z_label,
+            full_range,
         )
-    )
+        frame_traces = [{"z": values, "text": notes} for values, notes in frame_arrays]
 
-    # district map
-    cmap_fig = px.choropleth(
-        display_df,
-        geojson=geofile,
-        featureidkey="properties.707_dist_7",  # 'properties.ST_NM', #
-        locations="District_geo",
-        color=value_or_change,
-        labels={
-            "District_geo": "District, State",
-            "value": "NFHS-5 Value",
-            "Abs_Change": "NFHS (5-4) Change",
-            "Note_NFHS5": "Note",
-            "Note_Change": "Note",
-        },
-        hover_data=["Note_NFHS5" if value_or_change == "value" else "Note_Change"],
-        # color_continuous_scale = "RdBu",
-        color_continuous_scale=customed_color_scale,
-        range_color=full_range,
-        # color_discrete_map={'red':'red', 'orange':'orange', 'green':'green'},
-        # hover_data=[dd_value],
-        projection="mercator",
-        height=550,
-    )
+    if len(frames) > 1:
+        # frames carry only values and notes
+        cmap_fig = animated_figure(cmap_fig, list(frames), frame_traces)
+    elif value_or_change == "bivariate":
+        cmap_fig = bivariate_figure(cmap_fig, distr_kpi, distr_kpi_2)
 
-    table_df.reset_index(inplace=True)
-    # there are NA values for NFHS 5 and 4 in table_df
-    table_df.dropna(subset=["NFHS-4", "NFHS-5"], how="all", inplace=True)
-    table_df.rename(columns={"District name": "District"}, inplace=True)
+    # dash table (districts in selection): rows sent page by page
+    table_df = district_table(india_or_state, distr_kpi)
     # address numeric format data table
     num_format = (
         FormatTemplate.money(0)
@@ -540,21 +916,16 @@ def disp_in_district_map(india_or_state, distr_kpi, value_or_change, distr_dmn):
             "type": "numeric",
             "format": num_format,
         }
-        for i in table_df.columns
+        for i in table_df.columns.tolist() + ["Growth"]
     ]
 
     return (
-        update_cm_fig(cmap_fig),
+        cmap_fig,
         f"NFHS-5 (2019-21) Average: {matched_state}",
         f"{str(card_val[0] if card_val else 'N/A')}",
-        DataTable(
-            data=table_df.to_dict("records"),
-            columns=table_col_format,
-        ),
-        # csv to json: sharing data within Dash
-        table_df[[col for col in table_df.columns if col != "Growth"]].to_json(
-            orient="split"
-        ),
+        table_col_format,
+        # new selection: back to the first page
+        0,
         # share indicator domain
         distr_dmn,
         # share indicator name
@@ -562,21 +933,191 @@ def disp_in_district_map(india_or_state, distr_kpi, value_or_change, distr_dmn):
     )
 
 
+# %%
+# district table for a selection from the precomputed matrices (unformatted)
+@functools.lru_cache(maxsize=128)
+def district_table(india_or_state, distr_kpi):
+    kpi_col = district_kpi_pos[distr_kpi]
+    pcnt_scale = 1 if re.findall(r"(\bsurveyed|interviewed\b)", distr_kpi) else 100
+    table_rows = scope_selected_rows[india_or_state]
+    table_df = pd.DataFrame(
+        {
+            "State": district_states[table_rows],
+            "District": district_names[table_rows],
+            "NFHS-4": district_round_values["NFHS-4"][table_rows, kpi_col]
+            / pcnt_scale,
+            "NFHS-5": district_round_values["NFHS-5"][table_rows, kpi_col]
+            / pcnt_scale,
+            "Abs. Change": district_change_values[table_rows, kpi_col] / pcnt_scale,
+        }
+    )
+    # there are NA values for NFHS 5 and 4 in table_df
+    return table_df.dropna(subset=["NFHS-4", "NFHS-5"], how="all").reset_index(
+        drop=True
+    )
+
+
+# growth icon from the change column (computed for the rows sent only)
+def growth_icons(abs_change):
+    return np.where(abs_change.isna(), "", np.where(abs_change > 0, "📈", "📉"))
+
+
+# dash table custom filtering: split one "{column} operator value" expression
+# https://dash.plotly.com/datatable/callbacks
+filter_operators = [
+    ["ge ", ">="],
+    ["le ", "<="],
+    ["lt ", "<"],
+    ["gt ", ">"],
+    ["ne ", "!="],
+    ["eq ", "="],
+    ["contains "],
+    ["datestartswith "],
+]
+
+
+def split_filter_part(filter_part):
+    for operator_type in filter_operators:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find("{") + 1 : name_part.rfind("}")]
+
+                value_part = value_part.strip()
+                v0 = value_part[0] if value_part else ""
+                if v0 == value_part[-1:] and v0 in ("'", '"', "`"):
+                    value = value_part[1:-1].replace("\\" + v0, v0)
+                elif operator_type[0] in ("contains ", "datestartswith "):
+                    # text operators: the value as typed ("2", not 2.0)
+                    value = value_part
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                # word operators need spaces after them in the filter string,
+                # but we don't want these later
+                return name, operator_type[0].strip(), value
+
+    return [None] * 3
+
+
+# number of a comparison filter, None when it can't be parsed; percentage
+# columns hold fractions: "50" and "50%" are both 0.5
+def filter_number(filter_value, percent):
+    text = str(filter_value).strip()
+    if percent:
+        text = text.removesuffix("%")
+    number = pd.to_numeric(text, errors="coerce")
+    if pd.isna(number):
+        return None
+    return number / 100 if percent else number
+
+
+# apply the table filter expressions to a frame (percent: value columns shown
+# as percentages)
+def filter_table(table_df, filter_query, percent=False):
+    for filter_part in (filter_query or "").split(" && "):
+        col_name, operator, filter_value = split_filter_part(filter_part)
+        if col_name not in table_df.columns and col_name != "Growth":
+            continue
+        if col_name == "Growth":
+            table_df = table_df.assign(Growth=growth_icons(table_df["Abs. Change"]))
+        column = table_df[col_name]
+        if operator in ("eq", "ne", "lt", "le", "gt", "ge"):
+            # compare numbers with numbers, text with text (skip bad clauses)
+            if pd.api.types.is_numeric_dtype(column):
+                filter_value = filter_number(filter_value, percent)
+                if filter_value is None:
+                    continue
+            else:
+                filter_value = str(filter_value)
+            # these operators match pandas series operator method names
+            table_df = table_df.loc[getattr(column, operator)(filter_value)]
+        elif operator == "contains":
+            table_df = table_df.loc[
+                column.astype(str).str.contains(str(filter_value), case=False)
+            ]
+        elif operator == "datestartswith":
+            table_df = table_df.loc[column.astype(str).str.startswith(filter_value)]
+    return table_df
+
+
+# callback table page: filter, sort and slice on the server, send one page
+@callback(
+    Output("district-table", "data"),
+    Output("district-table", "page_count"),
+    Input("district-table", "page_current"),
+    Input("district-table", "page_size"),
+    Input("district-table", "sort_by"),
+    Input("district-table", "filter_query"),
+    Input("india-or-state-dd", "value"),
+    Input("kpi-district-map-dd", "value"),
+)
+def update_district_table_page(
+    page_current, page_size, sort_by, filter_query, india_or_state, distr_kpi
+):
+    if not distr_kpi or distr_kpi not in district_kpi_pos:
+        return [], 1
+
+    percent = "Rs." not in distr_kpi and not re.findall(
+        r"(\bsurveyed|interviewed\b)", distr_kpi
+    )
+    table_df = filter_table(
+        district_table(india_or_state, distr_kpi), filter_query, percent
+    )
+    if sort_by:
+        # growth icons sort as the sign of the change
+        table_df = table_df.sort_values(
+            [
+                "Abs. Change" if col["column_id"] == "Growth" else col["column_id"]
+                for col in sort_by
+            ],
+            ascending=[col["direction"] == "asc" for col in sort_by],
+            kind="mergesort",
+        )
+
+    page_current = page_current or 0
+    page_df = table_df.iloc[
+        page_current * page_size : (page_current + 1) * page_size
+    ].assign(Growth=lambda df: growth_icons(df["Abs. Change"]))
+    return (
+        page_df.to_dict("records"),
+        max(1, math.ceil(len(table_df) / page_size)),
+    )
+
+
+# %%
+# callback table handle: keep the selection's table server-side for download
+@callback(
+    Output("table-df", "data"),
+    Input("india-or-state-dd", "value"),
+    Input("kpi-district-map-dd", "value"),
+    State("session-id", "data"),
+)
+def store_district_table(india_or_state, distr_kpi, session_id):
+    if not distr_kpi or distr_kpi not in district_kpi_pos:
+        return None
+    return result_store.put(session_id, district_table(india_or_state, distr_kpi))
+
+
 # %%
 # callback download conversion
 @callback(
     Output("table-dwd", "data"),
     Input("btn-dwd", "n_clicks"),
-    State("table-df", "children"),
+    State("table-df", "data"),
     State("ind-dmn", "children"),
     State("ind-id", "children"),
     prevent_initial_call=True,
 )
-def download_table(_, df_table, ind_dom, ind_name):
-    if not df_table:
+def download_table(_, table_handle, ind_dom, ind_name):
+    df_table = result_store.get(table_handle)
+    if df_table is None:
         return None
     else:
-        df = pd.read_json(df_table, orient="split").rename(
+        df = df_table.rename(
             columns={
                 "NFHS-4": "NFHS-4 [%]",
                 "NFHS-5": "NFHS-5 [%]",
@@ -598,3 +1139,453 @@ def download_table(_, df_table, ind_dom, ind_name):
             quoting=csv.QUOTE_NONNUMERIC,
             filename="NFHS_4_5_table.csv",
         )
+
+
+# %%
+# callback bulk export link: file served by the export route (streamed)
+@callback(
+    Output("btn-export", "href"),
+    Input("india-or-state-dd", "value"),
+    Input("kpi-domain-map-dd", "value"),
+    Input("export-content-dd", "value"),
+    Input("export-format-dd", "value"),
+)
+def update_export_link(india_or_state, distr_dmn, export_content, export_format):
+    export_query = urlencode(
+        {
+            "scope": india_or_state,
+            "domain": distr_dmn if export_content == "domain" else export_content,
+            "format": export_format,
+        }
+    )
+    return f"{get_relative_path('/exports/district')}?{export_query}"
+
+
+# %%
+# callback similar districts: districts of the selection, a map click selects
+@callback(
+    Output("similar-district-dd", "options"),
+    Output("similar-district-dd", "value"),
+    Input("india-or-state-dd", "value"),
+    Input("district-or-state-plot", "clickData"),
+    State("similar-district-dd", "value"),
+)
+def update_similar_district_options(india_or_state, click_data, district_row):
+    rows = district_sorted_rows[
+        np.isin(district_sorted_rows, scope_selected_rows[india_or_state])
+    ]
+    labels = (
+        district_names[rows] + ", " + district_states[rows]
+        if "All India" in india_or_state
+        else district_names[rows]
+    )
+    values = rows.astype(str)
+    options = [{"label": l, "value": v} for l, v in zip(labels, values)]
+
+    # choropleth points carry the geometry key as location, tiles as customdata
+    if ctx.triggered_id == "district-or-state-plot" and click_data:
+        point = click_data["points"][0]
+        clicked = values[
+            district_geo_keys[rows] == point.get("location", point.get("customdata"))
+        ]
+        if clicked.size:
+            return options, clicked[0]
+    return options, district_row if district_row in values else values[0]
+
+
+# callback similar districts: row of the precomputed nearest districts
+@callback(
+    Output("similar-districts", "children"),
+    Input("similar-district-dd", "value"),
+    Input("radios-similar-profile", "value"),
+    Input("similar-k-dd", "value"),
+)
+def update_similar_districts(district_row, profile, similar_k):
+
+    if not (district_row or "").isdigit() or profile not in district_neighbours:
+        return []
+
+    row = int(district_row)
+    neighbours = district_neighbours[profile]
+    found = neighbours.rows[row, : int(similar_k)] >= 0
+    rows = neighbours.rows[row, : found.sum()]
+    title = (
+        f"Districts Most Like {district_names[row]}, {district_states[row]} "
+        f"({profile} profile, all districts)"
+    )
+    if not rows.size:
+        title = f"Not enough indicators reported for {district_names[row]}"
+
+    return [
+        html.P(
+            title,
+            style={
+                "fontWeight": "bold",
+                "textAlign": "left",
+                "color": "DeepSkyBlue",
+                "fontSize": "15px",
+                "marginBottom": "10px",
+            },
+        ),
+        DataTable(
+            data=[
+                {
+                    "Rank": i + 1,
+                    "State": district_states[a_row],
+                    "District": district_names[a_row],
+                    "Distance": float(neighbours.distance[row, i]),
+                    "Shared": int(neighbours.n_shared[row, i]),
+                }
+                for i, a_row in enumerate(rows)
+            ],
+            columns=[
+                {"name": "Rank", "id": "Rank"},
+                {"name": "State", "id": "State"},
+                {"name": "District", "id": "District"},
+                {
+                    "name": "Distance (SD)",
+                    "id": "Distance",
+                    "type": "numeric",
+                    "format": Format.Format(precision=2, scheme=Format.Scheme.fixed),
+                },
+                {"name": "Shared Indicators", "id": "Shared", "type": "numeric"},
+            ],
+            style_cell={
+                "whiteSpace": "normal",
+                "textAlign": "left",
+                "fontSize": "13px",
+            },
+        ),
+    ]
+
+
+# %%
+# clusters of all districts (national: same clusters in every scope) on the
+# chosen columns of the standardized matrix, unreported values at the mean;
+# only converged fits are kept (one stopped by the time budget depends on the
+# server load: refitted on the next request)
+cluster_fits = {}
+cluster_fits_max = 64
+
+
+def district_clusters(cluster_kpis, cluster_k, cluster_round):
+    key = (cluster_kpis, cluster_k, cluster_round)
+    if key in cluster_fits:
+        return cluster_fits[key]
+    scaled = district_wide_scaled[
+        :, [district_wide_pos[(kpi, cluster_round)] for kpi in cluster_kpis]
+    ].astype("float64")
+    reported = ~np.isnan(scaled)
+    scaled[~reported] = 0
+    scaled[reported.mean(axis=1) < cluster_min_share] = np.nan
+    fit = kmeans(scaled, cluster_k, cluster_time_budget)
+    if fit.converged:
+        if len(cluster_fits) >= cluster_fits_max:
+            cluster_fits.pop(next(iter(cluster_fits)))
+        cluster_fits[key] = fit
+    return fit
+
+
+# callback cluster map: categorical choropleth of the selection
+@callback(
+    Output("district-cluster-plot", "figure"),
+    Output("cluster-summary", "children"),
+    Input("india-or-state-dd", "value"),
+    Input("cluster-kpis-dd", "value"),
+    Input("cluster-k-dd", "value"),
+    Input("cluster-round-dd", "value"),
+)
+@cached_callback("district-clusters")
+def disp_district_clusters(india_or_state, cluster_kpis, cluster_k, cluster_round):
+
+    cluster_kpis = sorted(kpi for kpi in cluster_kpis or [] if kpi in district_kpi_pos)
+    if not cluster_kpis or (cluster_kpis[0], cluster_round) not in district_wide_pos:
+        return label_no_fig, []
+
+    fit = district_clusters(tuple(cluster_kpis), int(cluster_k), cluster_round)
+    n_clusters = len(fit.centers)
+    geo_rows = scope_geo_rows[india_or_state]
+    map_labels = fit.labels[geo_rows]
+    map_notes = np.array(
+        [
+            f"Cluster {label + 1}" if label >= 0 else "Not enough indicators reported"
+            for label in map_labels
+        ],
+        dtype=object,
+    )
+    unselected_pos = scope_unselected_pos[india_or_state]
+    map_labels[unselected_pos] = -1
+    map_notes[unselected_pos] = "District NOT in Selection"
+    cluster_fig = cluster_figure(
+        scope_geojson(india_or_state),
+        district_geo_keys[geo_rows],
+        map_labels,
+        map_notes,
+        n_clusters,
+    )
+
+    # cluster profiles: districts and mean reported values per indicator
+    kpi_cols = [district_wide_pos[(kpi, cluster_round)] for kpi in cluster_kpis]
+    values = district_wide_values[:, kpi_cols]
+    reported = ~np.isnan(values)
+    members = (fit.labels[:, None] == np.arange(n_clusters)).astype("float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cluster_means = (members.T @ np.where(reported, values, 0)) / (
+            members.T @ reported
+        )
+    round_label = {"NFHS-5 minus NFHS-4": "Change"}.get(cluster_round, cluster_round)
+    note = (
+        f"{n_clusters} Clusters of {(fit.labels >= 0).sum()} Districts "
+        f"({round_label}, {len(cluster_kpis)} indicators, all districts)"
+    )
+    if not fit.converged:
+        note += f", stopped after {fit.n_iter} iterations (time budget)"
+    num_format = Format.Format(precision=1, scheme=Format.Scheme.fixed)
+
+    outputs = (
+        cluster_fig,
+        [
+            html.P(
+                note,
+                style={
+                    "fontWeight": "bold",
+                    "textAlign": "left",
+                    "color": "DeepSkyBlue",
+                    "fontSize": "15px",
+                    "marginBottom": "10px",
+                },
+            ),
+            DataTable(
+                data=[
+                    {
+                        "Cluster": f"Cluster {i + 1}",
+                        "Districts": int(members[:, i].sum()),
+                        **{
+                            str(j): None if np.isnan(mean) else float(mean)
+                            for j, mean in enumerate(cluster_means[i])
+                        },
+                    }
+                    for i in range(n_clusters)
+                ],
+                columns=[
+                    {"name": "Cluster", "id": "Cluster"},
+                    {"name": "Districts", "id": "Districts", "type": "numeric"},
+                    *[
+                        {
+                            "name": kpi,
+                            "id": str(j),
+                            "type": "numeric",
+                            "format": num_format,
+                        }
+                        for j, kpi in enumerate(cluster_kpis)
+                    ],
+                ],
+                style_table={"overflowX": "auto"},
+                style_cell={
+                    "whiteSpace": "normal",
+                    "textAlign": "left",
+                    "fontSize": "13px",
+                    "minWidth": "90px",
+                },
+                style_data_conditional=[
+                    {
+                        "if": {
+                            "filter_query": f"{{Cluster}} = 'Cluster {i + 1}'",
+                            "column_id": "Cluster",
+                        },
+                        "backgroundColor": cluster_colors[i % len(cluster_colors)],
+                        "color": "white",
+                    }
+                    for i in range(n_clusters)
+                ],
+            ),
+        ],
+    )
+    # fit stopped by the time budget: sent, not kept in the response caches
+    if not fit.converged:
+        raise UncachedOutputs(outputs)
+    return outputs
+
+
+# %%
+# callback composite spec: one row per chosen indicator (edits kept)
+@callback(
+    Output("composite-spec-table", "data"),
+    Input("composite-kpis-dd", "value"),
+    State("composite-spec-table", "data"),
+)
+def update_composite_spec(composite_kpis, spec_rows):
+    current = {row["Indicator"]: row for row in spec_rows or []}
+    return [
+        current.get(
+            kpi, {"Indicator": kpi, "Weight": 1, "Direction": "Higher is better"}
+        )
+        for kpi in composite_kpis or []
+    ]
+
+
+# canonical weight spec (positive weights, sorted) and its short hash
+def composite_spec(spec_rows, normalization, composite_round):
+    components = []
+    for row in spec_rows or []:
+        try:
+            weight = float(row.get("Weight"))
+        except (TypeError, ValueError):
+            continue
+        if row.get("Indicator") in district_kpi_pos and weight > 0:
+            components.append(
+                (
+                    row["Indicator"],
+                    weight,
+                    composite_directions.get(row.get("Direction"), 1),
+                )
+            )
+    spec = (tuple(sorted(components)), normalization, composite_round)
+    return spec, composite_spec_hash(spec)
+
+
+def composite_spec_hash(spec):
+    return hashlib.sha1(json.dumps(spec).encode()).hexdigest()[:12]
+
+
+# scores of all districts for a spec (national normalization), ranked table
+# of the selection with the component values
+@functools.lru_cache(maxsize=64)
+def composite_table(india_or_state, spec):
+    components, normalization, composite_round = spec
+    kpis, weights, directions = zip(*components)
+    values = district_round_values[composite_round][
+        :, [district_kpi_pos[kpi] for kpi in kpis]
+    ]
+    scores = composite_index(values, weights, directions, normalization)
+    rows = scope_selected_rows[india_or_state]
+    table_df = pd.DataFrame(
+        {
+            "State": district_states[rows],
+            "District": district_names[rows],
+            "Score": scores[rows],
+            **{kpi: values[rows, j] for j, kpi in enumerate(kpis)},
+        }
+    )
+    table_df.insert(
+        0, "Rank", table_df.Score.rank(ascending=False, method="min").astype("Int64")
+    )
+    return scores, table_df.sort_values("Rank", kind="mergesort").reset_index(drop=True)
+
+
+# callback composite map and ranking: raw table rows to the canonical spec
+# (cache key: row order, blank rows or edits that leave the spec unchanged
+# reuse the cached response)
+@callback(
+    Output("district-composite-plot", "figure"),
+    Output("composite-title", "children"),
+    Output("composite-table", "columns"),
+    Output("composite-table", "data"),
+    Input("india-or-state-dd", "value"),
+    Input("composite-spec-table", "data"),
+    Input("radios-composite-norm", "value"),
+    Input("composite-round-dd", "value"),
+)
+def update_composite_index(india_or_state, spec_rows, normalization, composite_round):
+    spec, _ = composite_spec(spec_rows, normalization, composite_round)
+    if not spec[0] or composite_round not in district_round_values:
+        return label_no_fig, [], [], []
+    return disp_composite_index(india_or_state, spec)
+
+
+@cached_callback("district-composite")
+def disp_composite_index(india_or_state, spec):
+
+    # spec from json (cache warmer): back to hashable tuples
+    components, normalization, composite_round = spec
+    spec = (tuple(map(tuple, components)), normalization, composite_round)
+    spec_hash = composite_spec_hash(spec)
+    scores, table_df = composite_table(india_or_state, spec)
+
+    # map: as the indicator map, sentinels below the range in grey
+    geo_rows = scope_geo_rows[india_or_state]
+    map_values = scores[geo_rows]
+    map_notes = np.where(
+        np.isnan(map_values), "Value NOT Reported: (-1000)", "Value Reported"
+    ).astype(object)
+    map_values[np.isnan(map_values)] = -1000
+    unselected_pos = scope_unselected_pos[india_or_state]
+    map_values[unselected_pos] = -500
+    map_notes[unselected_pos] = "District NOT in Selection: (-500)"
+    range_values = table_df.Score.dropna()
+    full_range = (
+        [
+            range_values.min() - 0.002 * (range_values.max() - range_values.min()),
+            range_values.max(),
+        ]
+        if len(range_values)
+        else [None, None]
+    )
+    composite_fig = choropleth_figure(
+        scope_geojson(india_or_state),
+        district_geo_keys[geo_rows],
+        map_values,
+        map_notes,
+        "Composite Score",
+        full_range,
+    )
+
+    score_format = Format.Format(precision=2, scheme=Format.Scheme.fixed)
+    return (
+        composite_fig,
+        html.P(
+            f"Composite Index {spec_hash} ({composite_round}, "
+            f"{'Min-Max' if normalization == 'minmax' else 'Z-Score'}, "
+            f"{len(spec[0])} indicators)",
+            style={
+                "fontWeight": "bold",
+                "color": "DeepSkyBlue",
+                "fontSize": "15px",
+                "marginTop": "12px",
+            },
+        ),
+        [
+            {"name": "Rank", "id": "Rank", "type": "numeric"},
+            {"name": "State", "id": "State"},
+            {"name": "District", "id": "District"},
+            {"name": "Score", "id": "Score", "type": "numeric", "format": score_format},
+        ],
+        table_df[["Rank", "State", "District", "Score"]]
+        .astype(object)
+        .where(table_df[["Rank", "State", "District", "Score"]].notna(), None)
+        .to_dict("records"),
+    )
+
+
+# callback composite download: scores, ranks and component values
+@callback(
+    Output("composite-dwd", "data"),
+    Input("btn-composite-dwd", "n_clicks"),
+    State("india-or-state-dd", "value"),
+    State("composite-spec-table", "data"),
+    State("radios-composite-norm", "value"),
+    State("composite-round-dd", "value"),
+    prevent_initial_call=True,
+)
+def download_composite(_, india_or_state, spec_rows, normalization, composite_round):
+    spec, spec_hash = composite_spec(spec_rows, normalization, composite_round)
+    if not spec[0] or composite_round not in district_round_values:
+        return None
+    _, table_df = composite_table(india_or_state, spec)
+    # component columns labelled with their weight and direction
+    df = table_df.rename(
+        columns={
+            kpi: f"{kpi} [weight {weight:g}, {'lower' if direction < 0 else 'higher'} is better]"
+            for kpi, weight, direction in spec[0]
+        }
+    )
+    df["Index"] = spec_hash
+    df["Normalization"] = normalization
+    df["Round"] = composite_round
+    return dcc.send_data_frame(
+        df.to_csv,
+        index=False,
+        encoding="utf-8-sig",
+        quoting=csv.QUOTE_NONNUMERIC,
+        filename=f"NFHS_composite_{spec_hash}.csv",
+    )
@@ -1,6 +1,18 @@
-from dash import callback, dcc, html, Input, Output, State, register_page
+from dash import (
+    callback,
+    clientside_callback,
+    ClientsideFunction,
+    dcc,
+    html,
+    Input,
+    Output,
+    State,
+    register_page,
+)
+from dash.dash_table import DataTable, Format
 import dash_bootstrap_components as dbc
 import dash_treeview_antd
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import textwrap
@@ -8,13 +20,23 @@ import textwrap
 from . import (
     data_states,
     nfhs_dist_ind_df,
-    district_map_df,
+    district_kpi_corr,
+    district_kpi_map,
+    district_kpi_pos,
+    district_names,
+    district_sorted_rows,
+    district_states,
+    district_wide_pos,
+    district_wide_values,
     label_no_fig,
     ind_dom_dist_options,
     district_state_match,
     dist_state_kpi_df,
     df_nfhs_345,
 )
+from .analytics import grouped_ols_fit, packed_row
+from .figure_factory import webgl_point_threshold
+from .response_cache import cached_callback
 
 register_page(__name__, path="/district-scatter", title="District Scatter")
 
@@ -40,6 +62,27 @@ scatter_change = html.Div(
     className="radio-group",
 )
 
+# dbc ButtonGroup with RadioItems: one trendline or one per state
+scatter_trend = html.Div(
+    [
+        dbc.RadioItems(
+            id="radios-scatter-trend",
+            className="btn-group",
+            inputClassName="btn-check",
+            labelClassName="btn btn-outline-info",
+            labelCheckedClassName="active",
+            options=[
+                {"label": "Overall", "value": "overall"},
+                {"label": "Per State", "value": "state"},
+            ],
+            value="overall",
+            persistence=True,
+            persistence_type="session",
+        ),
+    ],
+    className="radio-group",
+)
+
 # dbc select: KPI map domain (x-axis)
 dd_domain_x = dbc.Select(
     id="kpi-x-dd",
@@ -160,6 +203,9 @@ layout = dbc.Container(
     [
         # mantain data until browser/tab closes
         dcc.Store(id="session", storage_type="session"),
+        # national data of the indicator pair, filtered in the browser
+        dcc.Store(id="scatter-data"),
+        dcc.Store(id="states-index", data=states_index),
         dbc.Row(
             [
                 dbc.Col(
@@ -296,6 +342,24 @@ layout = dbc.Container(
                     ),
                     width="auto",
                 ),
+                dbc.Col(
+                    html.Div(
+                        [
+                            html.P(
+                                "Select Trendline",
+                                style={
+                                    "fontWeight": "bold",
+                                    "textAlign": "left",
+                                    "color": "DeepSkyBlue",
+                                    "fontSize": "15px",
+                                    "marginBottom": "10px",
+                                },
+                            ),
+                            scatter_trend,
+                        ],
+                    ),
+                    width="auto",
+                ),
             ],
             justify="evenly",
             align="center",
@@ -318,6 +382,53 @@ layout = dbc.Container(
             align="center",
         ),
         html.Br(),
+        dbc.Row(
+            [
+                dbc.Col(
+                    html.Div(
+                        DataTable(
+                            id="state-fits-table",
+                            columns=[
+                                {"name": "State", "id": "State"},
+                                {"name": "Districts", "id": "n_obs"},
+                                *[
+                                    {
+                                        "name": name,
+                                        "id": col,
+                                        "type": "numeric",
+                                        "format": Format.Format(
+                                            precision=2, scheme=Format.Scheme.fixed
+                                        ),
+                                    }
+                                    for name, col in [
+                                        ("Slope", "slope"),
+                                        ("Intercept", "intercept"),
+                                        ("R²", "r_squared"),
+                                    ]
+                                ],
+                            ],
+                            sort_action="native",
+                            page_size=12,
+                            style_cell={"textAlign": "left", "fontSize": "13px"},
+                        ),
+                        id="state-fits",
+                        style={"display": "none"},
+                    ),
+                    width=10,
+                ),
+            ],
+            justify="evenly",
+            align="center",
+        ),
+        html.Br(),
+        dbc.Row(
+            [
+                dbc.Col(html.Div(id="related-kpis"), width=10),
+            ],
+            justify="evenly",
+            align="center",
+        ),
+        html.Br(),
     ],
     fluid=True,
     style={"paddingTop": "20px"},
@@ -354,297 +465,225 @@ def update_district_kpi_options(indicator_domain_x, indicator_domain_y):
 
 
 # %%
-# function to work out Active selection
-@callback(
+# active selection: checked tree to states, in the browser
+clientside_callback(
+    ClientsideFunction(namespace="scatter", function_name="update_states_selector"),
     Output("selections-button", "label"),
     Output("session", "data"),
     Input("states_selector", "checked"),
+    State("states-index", "data"),
 )
-# update dropdown options: indicator district based on indicator type
-def update_states_selector(checked_tree):
 
-    # checked tree to states
-    selected_states = (
-        "All India"
-        if "0" in checked_tree
-        else [states_index[k.split("-")[1]] for k in checked_tree]
-    )
 
-    return (
-        "Active Selection: "
-        + (
-            "All India"
-            if selected_states == "All India"
-            else f"{len(selected_states)} States"
-        ),
-        dict(
-            states=selected_states,
-        ),
-    )
+# %%
+# wide matrix rounds of the x and y axes per scatter mode
+scatter_rounds = {
+    "rounds": ("NFHS-4", "NFHS-5"),
+    "change": ("NFHS-5 minus NFHS-4", "NFHS-5 minus NFHS-4"),
+}
+# hover labels of the x and y axes per scatter mode
+scatter_labels = {
+    "rounds": ("NFHS-4 Value", "NFHS-5 Value"),
+    "change": ("NFHS (5-4) Change (X-Axis)", "NFHS (5-4) Change (Y-Axis)"),
+}
 
 
-# %%
+# totals by state (state data) of the state indicator matching a district
+# indicator: NFHS-4 or NFHS-5 value, or change
+def state_kpi_totals(distr_dmn, kpi, scatter_round):
+    match_kpi = dist_state_kpi_df.query(
+        "Dom_in_Dist == @distr_dmn & kpi_district == @kpi"
+    )
+    if pd.isna(*match_kpi.kpi_state):
+        return pd.Series(dtype="float64")
+    kpi_df = df_nfhs_345.query(
+        "`Indicator Type` == @match_kpi.Dom_in_State.values[0] & Indicator == @match_kpi.kpi_state.values[0]"
+    )
+    round_totals = {
+        a_round: kpi_df.query("NFHS == @a_round")
+        .drop_duplicates(subset="State")
+        .set_index("State")
+        .Total
+        for a_round in ["NFHS 4", "NFHS 5"]
+    }
+    if scatter_round == "NFHS-5 minus NFHS-4":
+        return round_totals["NFHS 5"] - round_totals["NFHS 4"]
+    return round_totals[scatter_round.replace("-", " ")]
+
+
+# national data of the indicator pair (rows sorted by state and district):
+# state selection, markers and trendlines are drawn in the browser
+# (assets/scatter_filter.js)
 @callback(
-    Output("district-plot-scatter", "figure"),
-    Output("card-tit-2", "children"),
-    Output("card-val-2", "children"),
+    Output("scatter-data", "data"),
     Input("radios-scatter-change", "value"),
-    Input("session", "data"),
     Input("kpi-district-list-1", "value"),
     Input("kpi-district-list-2", "value"),
     State("kpi-x-dd", "value"),
     State("kpi-y-dd", "value"),
 )
-def update_scatter(
-    value_or_change, state_values, kpi_1, kpi_2, distr_dmn_x, distr_dmn_y
-):
-
-    if not state_values:
-        return label_no_fig, [], "N/A"
-
-    # query dataframe
-    kpi_list = [kpi_1, kpi_2]
-    display_df = (
-        district_map_df.query(
-            "State in @state_values['states'] & variable in @kpi_list"
-            if state_values["states"] != "All India"
-            else "variable in @kpi_list"
+@cached_callback("district-scatter-data")
+def update_scatter_data(value_or_change, kpi_1, kpi_2, distr_dmn_x, distr_dmn_y):
+
+    if kpi_1 not in district_kpi_pos or kpi_2 not in district_kpi_pos:
+        return None
+
+    # x NFHS-4 / change, y NFHS-5 / change columns of the wide matrix
+    rows = district_sorted_rows
+    x_round, y_round = scatter_rounds[value_or_change]
+    x_label, y_label = scatter_labels[value_or_change]
+    state_codes, states = pd.factorize(district_states[rows])
+
+    # figure layout (titles, axes, template) of the scatter, without traces
+    kpi_x = f"{kpi_1} ({x_round})"
+    kpi_y = f"{kpi_2} ({y_round})"
+    layout = (
+        px.scatter(
+            pd.DataFrame({"State": [], kpi_x: [], kpi_y: []}),
+            x=kpi_x,
+            y=kpi_y,
+            color="State",
+            title=(
+                "Analysis of Indicators: NFHS-5 vs. NFHS-4"
+                if value_or_change == "rounds"
+                else "Analysis of Indicators Change: NFHS-5 minus NFHS-4"
+            ),
+            height=600,
         )
-        .pivot(
-            index=["State", "District name"],
-            columns=["variable", "Round"],
-            values="value",
+        .update_layout(title_x=0.5, legend_title_text="State")
+        .update_yaxes(
+            title="<br>".join(
+                textwrap.wrap(
+                    kpi_y if value_or_change == "rounds" else "Change in " + kpi_y,
+                    width=70,
+                )
+            ),
+            title_font=dict(size=11),
         )
-        .reset_index()
-    )
-
-    if display_df.empty:
-        return label_no_fig, [], "N/A"
-    else:
-        # computation of changes
-        display_df[(kpi_1, "NFHS-5 minus NFHS-4")] = (
-            display_df.set_index(["State", "District name"])[(kpi_1, "NFHS-5")]
-            - display_df.set_index(["State", "District name"])[(kpi_1, "NFHS-4")]
-        ).reset_index()[0]
-        display_df[(kpi_2, "NFHS-5 minus NFHS-4")] = (
-            display_df.set_index(["State", "District name"])[(kpi_2, "NFHS-5")]
-            - display_df.set_index(["State", "District name"])[(kpi_2, "NFHS-4")]
-        ).reset_index()[0]
-
-        # rejoin columns
-        display_df.columns = [
-            (" (".join(a_name) + ")").removesuffix(" ()")
-            for a_name in display_df.columns.to_flat_index()
-        ]
-
-        # rename columns
-        kpi_1 = (
-            " (".join(
-                [
-                    kpi_1,
-                    (
-                        "NFHS-4"
-                        if value_or_change == "rounds"
-                        else "NFHS-5 minus NFHS-4"
-                    ),
-                ]
-            )
-        ) + ")"
-        kpi_2 = (
-            " (".join(
-                [
-                    kpi_2,
-                    (
-                        "NFHS-5"
-                        if value_or_change == "rounds"
-                        else "NFHS-5 minus NFHS-4"
-                    ),
-                ]
-            )
-        ) + ")"
-        scatter_fig = (
-            px.scatter(
-                display_df,
-                x=kpi_1,
-                y=kpi_2,
-                color="State",
-                opacity=0.5,
-                trendline="ols",
-                trendline_scope="overall",
-                title=(
-                    "Analysis of Indicators: NFHS-5 vs. NFHS-4"
-                    if value_or_change == "rounds"
-                    else "Analysis of Indicators Change: NFHS-5 minus NFHS-4"
-                ),
-                hover_data=["District name"],
-                height=600,
-                labels={
-                    kpi_1: (
-                        "NFHS-4 Value"
-                        if value_or_change == "rounds"
-                        else "NFHS (5-4) Change (X-Axis)"
-                    ),
-                    kpi_2: (
-                        "NFHS-5 Value"
-                        if value_or_change == "rounds"
-                        else "NFHS (5-4) Change (Y-Axis)"
-                    ),
-                },
-            )
-            .update_layout(title_x=0.5)
-            .update_traces(marker=dict(size=14))
-            .update_yaxes(
-                title="<br>".join(
-                    textwrap.wrap(
-                        (
-                            kpi_2
-                            if value_or_change == "rounds"
-                            else "Change in " + kpi_2
-                        ),
-                        width=70,
-                    )
-                ),
-                title_font=dict(size=11),
-            )
-            .update_xaxes(
-                title="<br>".join(
-                    textwrap.wrap(
-                        (
-                            kpi_1
-                            if value_or_change == "rounds"
-                            else "Change in " + kpi_1
-                        ),
-                        width=70,
-                    )
-                ),
-                title_font=dict(size=11),
-            )
+        .update_xaxes(
+            title="<br>".join(
+                textwrap.wrap(
+                    kpi_x if value_or_change == "rounds" else "Change in " + kpi_x,
+                    width=70,
+                )
+            ),
+            title_font=dict(size=11),
         )
+        .layout
+    )
 
-        # mean: All India unless one State Selected
-        match_state = (
-            district_state_match.get(
-                state_values["states"][0], state_values["states"][0]
-            )
-            if len(state_values["states"]) == 1
-            else "All India"
-        )
-        # also match with states indicators
-        query_str_1 = (
-            "Dom_in_Dist == @distr_dmn_x & kpi_district == @kpi_1.removesuffix(' (NFHS-4)')"
+    # mean lines: All India, or the state matching a single selected state
+    x_totals = state_kpi_totals(distr_dmn_x, kpi_1, x_round)
+    y_totals = state_kpi_totals(distr_dmn_y, kpi_2, y_round)
+    means = {}
+    for a_state in ["All India", *states]:
+        match_state = district_state_match.get(a_state, a_state)
+        means[a_state] = {
+            "name": match_state,
+            "x": x_totals.get(match_state),
+            "y": y_totals.get(match_state),
+        }
+
+    # per-state trendlines (indexed by state code), fitted once here: the
+    # browser only picks the selected states and draws them
+    x = district_wide_values[rows, district_wide_pos[(kpi_1, x_round)]]
+    y = district_wide_values[rows, district_wide_pos[(kpi_2, y_round)]]
+    state_fits = grouped_ols_fit(x, y, state_codes, len(states))
+
+    return {
+        "x": x,
+        "y": y,
+        "state": state_codes,
+        "states": states.tolist(),
+        "state_fits": state_fits._asdict(),
+        "district": district_names[rows],
+        "labels": {"x": x_label, "y": y_label},
+        "means": means,
+        "mean_text": (
+            {"x": "Mean-X: ", "y": "Mean-Y: "}
             if value_or_change == "rounds"
-            else "Dom_in_Dist == @distr_dmn_x & kpi_district == @kpi_1.removesuffix(' (NFHS-5 minus NFHS-4)')"
-        )
-        match_kpi_1 = dist_state_kpi_df.query(query_str_1)
-        query_str_2 = (
-            "Dom_in_Dist == @distr_dmn_y & kpi_district == @kpi_2.removesuffix(' (NFHS-5)')"
-            if value_or_change == "rounds"
-            else "Dom_in_Dist == @distr_dmn_y & kpi_district == @kpi_2.removesuffix(' (NFHS-5 minus NFHS-4)')"
-        )
-        match_kpi_2 = dist_state_kpi_df.query(query_str_2)
-        x_avg = (
-            None
-            if pd.isna(*match_kpi_1.kpi_state)
-            else (
-                df_nfhs_345.query(
-                    "State == @match_state & `Indicator Type` == @match_kpi_1.Dom_in_State.values[0] & Indicator == @match_kpi_1.kpi_state.values[0] & NFHS == 'NFHS 4'"
-                ).Total.values
-                if value_or_change == "rounds"
-                else (
-                    df_nfhs_345.query(
-                        "State == @match_state & `Indicator Type` == @match_kpi_1.Dom_in_State.values[0] & Indicator == @match_kpi_1.kpi_state.values[0] & NFHS == 'NFHS 5'"
-                    )
-                    .set_index("State")
-                    .Total
-                    - df_nfhs_345.query(
-                        "State == @match_state & `Indicator Type` == @match_kpi_1.Dom_in_State.values[0] & Indicator == @match_kpi_1.kpi_state.values[0] & NFHS == 'NFHS 4'"
-                    )
-                    .set_index("State")
-                    .Total
-                ).values
-            )
-        )
-        y_avg = (
-            None
-            if pd.isna(*match_kpi_2.kpi_state)
-            else (
-                df_nfhs_345.query(
-                    "State == @match_state & `Indicator Type` == @match_kpi_2.Dom_in_State.values[0] & Indicator == @match_kpi_2.kpi_state.values[0] & NFHS == 'NFHS 5'"
-                ).Total.values
-                if value_or_change == "rounds"
-                else (
-                    df_nfhs_345.query(
-                        "State == @match_state & `Indicator Type` == @match_kpi_2.Dom_in_State.values[0] & Indicator == @match_kpi_2.kpi_state.values[0] & NFHS == 'NFHS 5'"
-                    )
-                    .set_index("State")
-                    .Total
-                    - df_nfhs_345.query(
-                        "State == @match_state & `Indicator Type` == @match_kpi_2.Dom_in_State.values[0] & Indicator == @match_kpi_2.kpi_state.values[0] & NFHS == 'NFHS 4'"
-                    )
-                    .set_index("State")
-                    .Total
-                ).values
-            )
-        )
+            else {"x": "Mean Change-X: ", "y": "Mean Change-Y: "}
+        ),
+        "layout": layout,
+        "no_data": label_no_fig,
+        # card title
+        "card_title": f"Relationship between {'NFHS-4 and NFHS-5' if value_or_change == 'rounds' else 'changes in NFHS-5 minus NFHS-4'} for Selected Indicators",
+        "colorway": px.colors.qualitative.Plotly,
+        "webgl_points": webgl_point_threshold,
+    }
+
+
+# selected states, markers, mean lines and trendlines (overall or per state)
+clientside_callback(
+    ClientsideFunction(namespace="scatter", function_name="update_scatter"),
+    Output("district-plot-scatter", "figure"),
+    Output("card-tit-2", "children"),
+    Output("card-val-2", "children"),
+    Output("state-fits-table", "data"),
+    Output("state-fits", "style"),
+    Input("scatter-data", "data"),
+    Input("session", "data"),
+    Input("radios-scatter-trend", "value"),
+)
 
-        # adjust scales for comparisson
-        x_min = display_df[kpi_1].min()
-        y_min = display_df[kpi_2].min()
-        x_max = display_df[kpi_1].max()
-        y_max = display_df[kpi_2].max()
-        # use same range to compare rounds
-        full_range = [[x_min, y_min], [x_max, y_max]]
-
-        # x_avg = display_df[kpi_1].mean()
-        if x_avg:
-            scatter_fig.add_vline(
-                x=x_avg[0], line_dash="dash", line_width=3, line_color="green"
-            ).update_traces(line_width=3)
-            # add text annotation to avg X
-            scatter_fig.add_annotation(
-                x=x_avg[0],
-                y=full_range[1][1],
-                text=f"{match_state} "
-                + ("Mean-X: " if value_or_change == "rounds" else "Mean Change-X: ")
-                + f"{x_avg[0]:.0f}",
-                showarrow=True,
-                arrowhead=2,
-                arrowcolor="green",
-                arrowsize=1.5,
-                font={"color": "green"},
-            )
 
-        # y_avg = display_df[kpi_2].mean()
-        if y_avg:
-            scatter_fig.add_hline(
-                y=y_avg[0], line_dash="dash", line_width=3, line_color="green"
-            ).update_traces(line_width=3)
-            # add text annotation to avg Y
-            scatter_fig.add_annotation(
-                x=full_range[1][0],
-                y=y_avg[0],
-                xanchor="left",
-                text=f"{match_state} "
-                + ("Mean-Y: " if value_or_change == "rounds" else "Mean Change-Y: ")
-                + f"{y_avg[0]:.0f}",
-                showarrow=True,
-                arrowhead=2,
-                arrowcolor="green",
-                arrowsize=1.5,
-                font={"color": "green"},
-            )
+# %%
+# most related indicators to the x-axis one: row of the precomputed
+# correlation matrix (all districts) of the x-axis round: NFHS-4 or change
+related_kpis_top = 10
 
-        r_sq = round(
-            px.get_trendline_results(scatter_fig).px_fit_results.iloc[0].rsquared, 2
-        )
-        scatter_fig.data[
-            -1
-        ].hovertemplate = f"<b>OLS trendline</b><br>R<sup>2</sup>={r_sq}"
-
-        return (
-            scatter_fig,
-            # card title
-            f"Relationship between {'NFHS-4 and NFHS-5' if value_or_change == 'rounds' else 'changes in NFHS-5 minus NFHS-4'} for Selected Indicators",
-            # card value
-            f"R2 of the correlation: {r_sq}",
-        )
+
+@callback(
+    Output("related-kpis", "children"),
+    Input("kpi-district-list-1", "value"),
+    Input("radios-scatter-change", "value"),
+)
+def update_related_kpis(kpi_1, value_or_change):
+
+    if kpi_1 not in district_kpi_pos:
+        return []
+
+    corr_round = scatter_rounds[value_or_change][0]
+    others, corr = packed_row(
+        district_kpi_corr[corr_round], district_kpi_pos[kpi_1], len(district_kpi_map)
+    )
+    strength = np.nan_to_num(np.abs(corr), nan=-1)
+    top = np.argsort(-strength, kind="stable")[:related_kpis_top]
+    top = top[strength[top] >= 0]
+    num_format = Format.Format(precision=2, scheme=Format.Scheme.fixed)
+
+    return [
+        html.P(
+            f"Most Related Indicators to the X-Axis KPI ({corr_round}, all districts)",
+            style={
+                "fontWeight": "bold",
+                "textAlign": "left",
+                "color": "DeepSkyBlue",
+                "fontSize": "15px",
+                "marginBottom": "10px",
+            },
+        ),
+        DataTable(
+            data=[
+                {
+                    "Indicator": district_kpi_map[others[i]],
+                    "r": float(corr[i]),
+                    "R2": float(corr[i]) ** 2,
+                }
+                for i in top
+            ],
+            columns=[
+                {"name": "Indicator", "id": "Indicator"},
+                {"name": "r", "id": "r", "type": "numeric", "format": num_format},
+                {"name": "R²", "id": "R2", "type": "numeric", "format": num_format},
+            ],
+            style_cell={
+                "whiteSpace": "normal",
+                "textAlign": "left",
+                "fontSize": "13px",
+            },
+            style_cell_conditional=[
+                {"if": {"column_id": ["r", "R2"]}, "width": "80px"},
+            ],
+        ),
+    ]
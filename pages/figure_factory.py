@@ -0,0 +1,288 @@
+import copy
+
+import plotly.express as px
+
+# %%
+# customed px continous color scale: name
+color_scale_name = "Rainbow"
+color_names = getattr(px.colors.sequential, color_scale_name)
+
+# customed color scale with color for NaNs
+color_nan = "Gray"
+customed_color_nan = [
+    [0, color_nan],
+    [0.001, color_nan],
+    [0.001, color_names[0]],
+]
+customed_color_rem = [
+    [(i + 1) / (len(color_names) - 1), a_color]
+    for i, a_color in enumerate(color_names[1:])
+]
+customed_color_scale = customed_color_nan + customed_color_rem
+
+# %%
+# prebuilt district map layout: what px.choropleth + update_cm_fig produced
+# (plotly template reduced to the attributes a hidden-basemap choropleth uses)
+choropleth_base_layout = {
+    "geo": {
+        "domain": {"x": [0.0, 1.0], "y": [0.0, 1.0]},
+        "projection": {"type": "mercator"},
+        "fitbounds": "locations",
+        "visible": False,
+        "bgcolor": "white",
+    },
+    "coloraxis": {
+        "colorscale": customed_color_scale,
+        "colorbar": {"len": 0.85, "x": 0.78, "outlinewidth": 0, "ticks": ""},
+    },
+    "margin": {"r": 0, "t": 0, "l": 0, "b": 0},
+    "height": 550,
+    "font": {"color": "#2a3f5f"},
+    "hoverlabel": {"align": "left"},
+    "paper_bgcolor": "white",
+}
+
+# district boundaries: feature id in geojson properties and line style
+district_featureidkey = "properties.707_dist_7"
+district_marker = {"line": {"color": "Gainsboro", "width": 0.5}}
+# tile map: district centroid markers (colour from the values)
+district_point_marker = {"coloraxis": "coloraxis", "size": 9}
+
+# charts switch to WebGL (scattergl) above these sizes: points drawn, or
+# series (lines) in a chart
+webgl_point_threshold = 500
+webgl_series_threshold = 50
+
+
+# %%
+# district choropleth as a plain figure dict (arrays go straight to json)
+def choropleth_figure(geojson, locations, z, notes, z_label, z_range):
+    layout = copy.deepcopy(choropleth_base_layout)
+    layout["coloraxis"].update(cmin=z_range[0], cmax=z_range[1])
+    layout["coloraxis"]["colorbar"]["title"] = {"text": z_label}
+    return {
+        "data": [
+            {
+                "type": "choropleth",
+                "geojson": geojson,
+                "featureidkey": district_featureidkey,
+                "locations": locations,
+                "z": z,
+                "text": notes,
+                "coloraxis": "coloraxis",
+                "geo": "geo",
+                "name": "",
+                "marker": district_marker,
+                "hovertemplate": "District, State=%{location}<br>Note=%{text}<br>"
+                + z_label
+                + "=%{z}<extra></extra>",
+            }
+        ],
+        "layout": layout,
+    }
+
+
+# %%
+# tile map: blank base style, district boundaries from the local vector tiles
+# (line layer, drawn over the built zooms only) and values as coloured markers
+# at the district centroids
+def tile_map_figure(
+    tile_url, zoom_range, view, locations, lon, lat, z, notes, z_label, z_range
+):
+    layout = copy.deepcopy(choropleth_base_layout)
+    del layout["geo"]
+    layout["coloraxis"].update(cmin=z_range[0], cmax=z_range[1])
+    layout["coloraxis"]["colorbar"]["title"] = {"text": z_label}
+    layout["mapbox"] = {
+        "style": "white-bg",
+        **view,
+        "layers": [
+            {
+                "sourcetype": "vector",
+                "source": [tile_url],
+                "sourcelayer": "districts",
+                "type": "line",
+                "color": district_marker["line"]["color"],
+                "line": {"width": 1},
+                "below": "traces",
+                # no requests for zooms not cut (shown up to the next zoom)
+                "minzoom": zoom_range[0],
+                "maxzoom": zoom_range[1] + 1,
+            }
+        ],
+    }
+    return {
+        "data": [
+            {
+                "type": "scattermapbox",
+                "mode": "markers",
+                "lon": lon,
+                "lat": lat,
+                "customdata": locations,
+                "text": notes,
+                "marker": {"color": z, **district_point_marker},
+                "name": "",
+                "hovertemplate": "District, State=%{customdata}<br>Note=%{text}<br>"
+                + z_label
+                + "=%{marker.color}<extra></extra>",
+            }
+        ],
+        "layout": layout,
+    }
+
+
+# %%
+# animated map: one frame per round, frames restyle only the per-round trace
+# attributes (geometry / marker positions are sent once, in the base trace)
+def animated_figure(figure, frame_names, frame_traces):
+    figure["data"][0].update(frame_traces[0])
+    figure["frames"] = [
+        {"name": name, "data": [trace], "traces": [0]}
+        for name, trace in zip(frame_names, frame_traces)
+    ]
+    frame_args = {
+        "frame": {"duration": 1200, "redraw": True},
+        "transition": {"duration": 0},
+        "mode": "immediate",
+    }
+    figure["layout"]["updatemenus"] = [
+        {
+            "type": "buttons",
+            "direction": "left",
+            "showactive": False,
+            "x": 0.02,
+            "y": 0.02,
+            "xanchor": "left",
+            "yanchor": "bottom",
+            "buttons": [
+                {"label": "Play", "method": "animate", "args": [None, frame_args]},
+                {
+                    "label": "Pause",
+                    "method": "animate",
+                    "args": [[None], {**frame_args, "frame": {"duration": 0}}],
+                },
+            ],
+        }
+    ]
+    figure["layout"]["sliders"] = [
+        {
+            "active": 0,
+            "x": 0.2,
+            "y": 0.02,
+            "len": 0.5,
+            "yanchor": "bottom",
+            "currentvalue": {"prefix": "Round: "},
+            "steps": [
+                {
+                    "label": name,
+                    "method": "animate",
+                    "args": [[name], {**frame_args, "frame": {"duration": 0}}],
+                }
+                for name in frame_names
+            ],
+        }
+    ]
+    return figure
+
+
+# %%
+# categorical district maps: codes 0..n-1 (and -1 grey) as the steps of the
+# colour scale, one trace (geometry sent once)
+def stepped_colorscale(step_colors):
+    return [
+        [(i + edge) / len(step_colors), a_color]
+        for i, a_color in enumerate(step_colors)
+        for edge in [0, 1]
+    ]
+
+
+# district clusters: a colour per cluster, districts without a cluster grey
+cluster_colors = px.colors.qualitative.Plotly
+
+
+def cluster_figure(geojson, locations, labels, notes, n_clusters):
+    figure = choropleth_figure(
+        geojson, locations, labels, notes, "Cluster", [-1.5, n_clusters - 0.5]
+    )
+    step_colors = [color_nan] + [
+        cluster_colors[i % len(cluster_colors)] for i in range(n_clusters)
+    ]
+    colorbar = figure["layout"]["coloraxis"]["colorbar"]
+    figure["layout"]["coloraxis"]["colorscale"] = stepped_colorscale(step_colors)
+    colorbar.update(
+        tickvals=list(range(-1, n_clusters)),
+        ticktext=["No cluster"] + [f"Cluster {i + 1}" for i in range(n_clusters)],
+    )
+    trace = figure["data"][0]
+    trace["hovertemplate"] = "District, State=%{location}<br>%{text}<extra></extra>"
+    return figure
+
+
+# %%
+# bivariate map: 3 x 3 classes (3 * y tertile + x tertile), x low to high
+# along the rows; legend as a grid of squares instead of the colour bar
+bivariate_colors = [
+    "#e8e8e8",
+    "#e4acac",
+    "#c85a5a",
+    "#b0d5df",
+    "#ad9ea5",
+    "#985356",
+    "#64acbe",
+    "#627f8c",
+    "#574249",
+]
+bivariate_legend_origin = (0.8, 0.08)
+bivariate_legend_square = 0.04
+
+
+# choropleth or tile map figure with the codes as values (-1: grey)
+def bivariate_figure(figure, x_label, y_label):
+    coloraxis = figure["layout"]["coloraxis"]
+    coloraxis.update(
+        cmin=-1.5,
+        cmax=len(bivariate_colors) - 0.5,
+        colorscale=stepped_colorscale([color_nan] + bivariate_colors),
+        showscale=False,
+    )
+    trace = figure["data"][0]
+    location = "%{location}" if trace["type"] == "choropleth" else "%{customdata}"
+    trace["hovertemplate"] = f"District, State={location}<br>%{{text}}<extra></extra>"
+
+    (x0, y0), size = bivariate_legend_origin, bivariate_legend_square
+    figure["layout"]["shapes"] = [
+        {
+            "type": "rect",
+            "xref": "paper",
+            "yref": "paper",
+            "x0": x0 + i % 3 * size,
+            "x1": x0 + (i % 3 + 1) * size,
+            # squares: the map is wider than high
+            "y0": y0 + i // 3 * size * 1.6,
+            "y1": y0 + (i // 3 + 1) * size * 1.6,
+            "fillcolor": a_color,
+            "line": {"color": "white", "width": 1},
+        }
+        for i, a_color in enumerate(bivariate_colors)
+    ]
+    axis_label = {"xref": "paper", "yref": "paper", "showarrow": False}
+    figure["layout"]["annotations"] = [
+        {
+            **axis_label,
+            "x": x0 + 1.5 * size,
+            "y": y0,
+            "yanchor": "top",
+            "text": f"{x_label[:40]} \u2192",
+            "font": {"size": 11},
+        },
+        {
+            **axis_label,
+            "x": x0,
+            "y": y0 + 2.4 * size,
+            "xanchor": "right",
+            "textangle": -90,
+            "text": f"{y_label[:40]} \u2192",
+            "font": {"size": 11},
+        },
+    ]
+    return figure
@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+import json
+import os
+
+from flask import Blueprint, Response, jsonify, request
+import numpy as np
+
+from . import data_version, geo_dict, geo_json_dict
+from .response_cache import cache_dir
+
+# %%
+# district boundaries per scope and resolution, gzip files on disk
+geo_dir = os.path.join(cache_dir, "geo")
+# simplification levels: RDP tolerance (degrees) and coordinate decimals
+geo_levels = {
+    "full": (None, None),
+    "medium": (0.005, 4),
+    "low": (0.02, 3),
+}
+# long-lived: the etag changes with the data snapshot
+geo_cache_control = "public, max-age=604800"
+geo_scopes = ["All India", *geo_dict]
+
+
+# %%
+# Ramer-Douglas-Peucker: mask of the points kept in a line or ring
+def rdp_mask(points, tolerance):
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        inner = points[start + 1 : end] - points[start]
+        segment_len = np.hypot(*segment)
+        # closed ring (start == end): distance to the start point
+        distance = (
+            np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / segment_len
+            if segment_len
+            else np.hypot(inner[:, 0], inner[:, 1])
+        )
+        farthest = int(np.argmax(distance))
+        if distance[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack += [(start, split), (split, end)]
+    return keep
+
+
+def simplify_ring(ring, tolerance, decimals):
+    points = np.asarray(ring, dtype="float64")
+    if tolerance and len(points) > 4:
+        keep = rdp_mask(points, tolerance)
+        # rings keep at least a triangle
+        if keep.sum() >= 4:
+            points = points[keep]
+    if decimals is not None:
+        points = points.round(decimals)
+    return points.tolist()
+
+
+def simplify_geometry(geometry, level):
+    tolerance, decimals = geo_levels[level]
+    if tolerance is None and decimals is None:
+        return geometry
+    if geometry["type"] == "Polygon":
+        coordinates = [
+            simplify_ring(ring, tolerance, decimals) for ring in geometry["coordinates"]
+        ]
+    else:
+        coordinates = [
+            [simplify_ring(ring, tolerance, decimals) for ring in polygon]
+            for polygon in geometry["coordinates"]
+        ]
+    return {"type": geometry["type"], "coordinates": coordinates}
+
+
+# %%
+# file per scope and level (named by data version)
+def geo_path(scope, level):
+    geo_id = hashlib.sha1(f"{scope}\n{level}".encode()).hexdigest()[:16]
+    return os.path.join(geo_dir, f"{data_version}-{geo_id}.geojson.gz")
+
+
+def write_geo(scope, level):
+    features = geo_json_dict["features"] if scope == "All India" else geo_dict[scope]
+    geojson = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": feature["properties"],
+                "geometry": simplify_geometry(feature["geometry"], level),
+            }
+            for feature in features
+        ],
+    }
+    path = geo_path(scope, level)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        # mtime=0: same bytes for the same geometry (stable across builds)
+        f.write(
+            gzip.compress(
+                json.dumps(geojson, separators=(",", ":")).encode(), 9, mtime=0
+            )
+        )
+    os.replace(tmp_path, path)
+    return path
+
+
+# existing file, else written on first request
+def get_geo(scope, level):
+    path = geo_path(scope, level)
+    if not os.path.exists(path):
+        write_geo(scope, level)
+    return path
+
+
+os.makedirs(geo_dir, exist_ok=True)
+
+# %%
+# flask route: ?state=All India&level=full|medium|low
+geo_blueprint = Blueprint("geo_api", __name__)
+
+
+@geo_blueprint.route("/geo/districts")
+def geo_districts():
+    scope = request.args.get("state", "All India")
+    # programme scopes (aspirational, gavi, laqshya) use the national map
+    if "All India" in scope:
+        scope = "All India"
+    level = request.args.get("level", "full")
+    if scope not in geo_scopes or level not in geo_levels:
+        response = jsonify(error=f"unknown state or level: {scope}, {level}")
+        response.status_code = 400
+        return response
+
+    etag = hashlib.sha1(f"{data_version}\n{scope}\n{level}".encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        with open(get_geo(scope, level), "rb") as f:
+            payload = f.read()
+        response = Response(payload, mimetype="application/geo+json")
+        if "gzip" in request.headers.get("Accept-Encoding", ""):
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response.set_data(gzip.decompress(payload))
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = geo_cache_control
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
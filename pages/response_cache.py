@@ -0,0 +1,338 @@
+import atexit
+from collections import OrderedDict
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from flask import Blueprint, jsonify
+from plotly.utils import PlotlyJSONEncoder
+
+from . import data_version
+
+# %%
+# cache size bound (bytes of serialized outputs), override with env variable
+cache_max_bytes = int(os.environ.get("NFHS_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# shared on-disk tier: local directory and bound (bytes of compressed entries)
+cache_dir = os.environ.get("NFHS_CACHE_DIR", "./cache")
+disk_cache_max_bytes = int(
+    os.environ.get("NFHS_DISK_CACHE_MAX_BYTES", 1024 * 1024 * 1024)
+)
+
+
+# %%
+# size-aware LRU of serialized callback outputs (one per worker process)
+class ResponseCache:
+    def __init__(self, max_bytes, version):
+        self.max_bytes = max_bytes
+        self.version = version
+        self.entries = OrderedDict()
+        self.size = 0
+        # cached callback lookups of this worker by tier that answered
+        self.lookups = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is not None:
+                self.entries.move_to_end(key)
+            return payload
+
+    def count(self, lookup):
+        with self.lock:
+            self.lookups[lookup] += 1
+
+    def put(self, key, payload):
+        # entries larger than the whole budget are never stored
+        if len(payload) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = payload
+            self.size += len(payload)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "version": self.version,
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                **self.lookups,
+            }
+
+
+response_cache = ResponseCache(cache_max_bytes, data_version)
+
+
+# %%
+# cross-worker tier: sqlite file shared by all gunicorn workers on the host
+# entries are zlib-compressed and tagged with the data version
+class DiskCache:
+    def __init__(self, path, max_bytes, version):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.version = version
+        self.local = threading.local()
+        with self.connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, version TEXT, payload BLOB, "
+                "size INTEGER, accessed REAL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+            )
+            # entries from previous data snapshots are never served again
+            conn.execute("DELETE FROM responses WHERE version != ?", (version,))
+            # request counts per callback inputs (kept across data versions)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS popularity ("
+                "key TEXT PRIMARY KEY, name TEXT, args TEXT, "
+                "count INTEGER, last_seen REAL)"
+            )
+
+    # one connection per thread and process (workers fork after import)
+    def connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        try:
+            conn = self.connect()
+            row = conn.execute(
+                "SELECT payload FROM responses WHERE key = ? AND version = ?",
+                (key, self.version),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            return zlib.decompress(row[0])
+        except (sqlite3.Error, zlib.error):
+            return None
+
+    def put(self, key, payload):
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) > self.max_bytes:
+            return
+        try:
+            conn = self.connect()
+            # single transaction: readers see the old entry or the new one
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (key, self.version, compressed, len(compressed), time.time()),
+                )
+                self.evict(conn)
+        except sqlite3.Error:
+            pass
+
+    # evict least recently accessed entries beyond the size bound
+    def evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[
+            0
+        ]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        evicted_keys = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed"
+        ):
+            evicted_keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", evicted_keys)
+
+    def contains(self, key):
+        try:
+            return (
+                self.connect()
+                .execute(
+                    "SELECT 1 FROM responses WHERE key = ? AND version = ?",
+                    (key, self.version),
+                )
+                .fetchone()
+                is not None
+            )
+        except sqlite3.Error:
+            return False
+
+    def add_popularity(self, counts):
+        try:
+            with self.connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT INTO popularity VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET "
+                    "count = count + excluded.count, last_seen = excluded.last_seen",
+                    [
+                        (key, name, args, count, last_seen)
+                        for key, (name, args, count, last_seen) in counts.items()
+                    ],
+                )
+        except sqlite3.Error:
+            pass
+
+    # most requested callback inputs: [(key, name, args), ...]
+    def top_requests(self, limit):
+        rows = (
+            self.connect()
+            .execute(
+                "SELECT key, name, args FROM popularity "
+                "ORDER BY count DESC, last_seen DESC LIMIT ?",
+                (limit,),
+            )
+            .fetchall()
+        )
+        return [(key, name, json.loads(args)) for key, name, args in rows]
+
+    def stats(self):
+        entries, size = (
+            self.connect()
+            .execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses")
+            .fetchone()
+        )
+        return {
+            "version": self.version,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+os.makedirs(cache_dir, exist_ok=True)
+disk_cache = DiskCache(
+    os.path.join(cache_dir, "responses.sqlite"), disk_cache_max_bytes, data_version
+)
+
+
+# %%
+# request popularity: counted in memory, flushed to the shared store
+popularity_flush_seconds = 30
+
+
+class PopularityCounter:
+    def __init__(self, store, flush_seconds):
+        self.store = store
+        self.flush_seconds = flush_seconds
+        self.counts = {}
+        self.flushed = time.time()
+        self.lock = threading.Lock()
+
+    def record(self, key, name, args):
+        now = time.time()
+        with self.lock:
+            entry = self.counts.setdefault(
+                key, [name, json.dumps(args, default=str), 0, now]
+            )
+            entry[2] += 1
+            entry[3] = now
+            flush_due = now - self.flushed > self.flush_seconds
+        if flush_due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, {}
+            self.flushed = time.time()
+        if counts:
+            self.store.add_popularity(counts)
+
+
+popularity = PopularityCounter(disk_cache, popularity_flush_seconds)
+atexit.register(popularity.flush)
+
+# cached callbacks by name: recomputed by the cache warmer
+cached_functions = {}
+
+
+# %%
+# key: callback name + inputs (json for dicts/lists from dcc.Store)
+def response_key(name, args):
+    return hashlib.sha1(
+        json.dumps([name, args], sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+# serialize outputs once: figures, components and tuples into json bytes
+def serialize_outputs(outputs):
+    return json.dumps(
+        [isinstance(outputs, tuple), outputs], cls=PlotlyJSONEncoder
+    ).encode()
+
+
+def deserialize_outputs(payload):
+    is_tuple, outputs = json.loads(payload)
+    return tuple(outputs) if is_tuple else outputs
+
+
+# raised by a cached callback with outputs to send but not to store (they
+# depend on more than the inputs, e.g. a fit cut short by a time budget)
+class UncachedOutputs(Exception):
+    def __init__(self, outputs):
+        super().__init__()
+        self.outputs = outputs
+
+
+# decorator: serve repeated selections from the worker cache, then from the
+# shared disk cache (results computed by any worker), else compute and store
+def cached_callback(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = response_key(name, args)
+            popularity.record(key, name, args)
+            lookup = "memory_hits"
+            payload = response_cache.get(key)
+            if payload is None:
+                lookup = "disk_hits"
+                payload = disk_cache.get(key)
+                if payload is None:
+                    lookup = "misses"
+                    try:
+                        payload = serialize_outputs(func(*args))
+                    except UncachedOutputs as uncached:
+                        response_cache.count(lookup)
+                        return uncached.outputs
+                    disk_cache.put(key, payload)
+                response_cache.put(key, payload)
+            response_cache.count(lookup)
+            return deserialize_outputs(payload)
+
+        cached_functions[name] = func
+        return wrapper
+
+    return decorator
+
+
+# %%
+# flask route: cache sizes and lookup counts (memory tier and counts are per
+# worker: the one serving the request, by pid)
+cache_blueprint = Blueprint("cache_stats", __name__)
+
+
+@cache_blueprint.route("/cache/stats")
+def cache_stats():
+    return jsonify(
+        pid=os.getpid(), memory=response_cache.stats(), disk=disk_cache.stats()
+    )
@@ -0,0 +1,83 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+from .response_cache import cache_dir
+
+# %%
+# seconds a stored result stays available to the session's next callbacks
+result_ttl = float(os.environ.get("NFHS_RESULT_TTL", 3600))
+# minimum seconds between sweeps of expired results
+result_sweep_seconds = 60
+
+
+# %%
+# server-side results (data frames) shared between the callbacks of a session:
+# the browser only holds a handle {"session": ..., "request": ...}
+class ResultStore:
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self.swept = 0
+        self.local = threading.local()
+        with self.connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "session TEXT, request TEXT, payload BLOB, created REAL, "
+                "PRIMARY KEY (session, request))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS results_created ON results (created)"
+            )
+
+    # one connection per thread and process (workers fork after import)
+    def connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    # store a result for the session, return its handle
+    def put(self, session_id, result):
+        handle = {"session": session_id or "", "request": uuid.uuid4().hex}
+        payload = zlib.compress(pickle.dumps(result, pickle.HIGHEST_PROTOCOL), 1)
+        now = time.time()
+        conn = self.connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+            (handle["session"], handle["request"], payload, now),
+        )
+        if now - self.swept > result_sweep_seconds:
+            self.swept = now
+            conn.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,))
+        return handle
+
+    # result for a handle (None if missing or expired)
+    def get(self, handle):
+        if not handle:
+            return None
+        row = (
+            self.connect()
+            .execute(
+                "SELECT payload FROM results "
+                "WHERE session = ? AND request = ? AND created >= ?",
+                (
+                    handle.get("session", ""),
+                    handle.get("request", ""),
+                    time.time() - self.ttl,
+                ),
+            )
+            .fetchone()
+        )
+        return None if row is None else pickle.loads(zlib.decompress(row[0]))
+
+
+result_store = ResultStore(os.path.join(cache_dir, "results.sqlite"), result_ttl)
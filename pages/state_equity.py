@@ -3,7 +3,6 @@ from dash import callback, dcc, html, Input, Output, State, register_page
 from dash.dash_table import DataTable, FormatTemplate
 import dash_bootstrap_components as dbc
 import dash_treeview_antd
-import pandas as pd
 from pandas.api.types import CategoricalDtype
 import plotly.express as px
 
@@ -15,6 +14,8 @@ from . import (
     equity_kpi_index,
     equity_dom_cat,
 )
+from .response_cache import cached_callback
+from .result_store import result_store
 
 register_page(__name__, path="/state-equity", title="State Equity")
 
@@ -308,8 +309,8 @@ layout = dbc.Container(
             align="center",
             style={"paddingTop": "30px", "paddingBottom": "20px"},
         ),
-        # hidden div: share data table in Dash
-        html.Div(id="df-equity", style={"display": "none"}),
+        # handle of the equity table kept server-side (result store)
+        dcc.Store(id="df-equity"),
         # share data in Dash with store element
         dcc.Store(id="selections"),
     ],
@@ -442,33 +443,14 @@ sel_col_dwd = [
     "Year",
     "State",
 ]
-# create equity datatable function
-@callback(
-    Output("df-equity", "children"),
-    Output("state-equity-plot", "figure"),
-    Output("selections", "data"),
-    Input("dd-states-equity", "value"),
-    Input("dd-equity-round", "value"),
-    Input("dd-equity-disagg", "value"),
-    Input("equity-session", "data"),
-)
-def update_equity_plot(state_value, round_value, disagg_value, selected_kpi):
 
-    kpi_values = selected_kpi["kpis"]
-
-    if not kpi_values:
-        return {}, label_no_fig, {}
 
+# equity values for the selections (long format: one row per kpi and bar)
+def equity_display_df(state_value, round_value, disagg_value, kpi_values):
     col_map = equity_dom_cat[disagg_value]["categories"]
-    tip_val = (
-        equity_dom_cat[disagg_value]["a_b_categories"]
-        if disagg_value != "Total"
-        else ["Total"]
-    )
-
     # bar colors
     bar_colors = ["Total", *col_map] if disagg_value != "Total" else col_map
-    display_df = (
+    return (
         df_equity.query(
             "State == @state_value & Year == @round_value & Indicator in @kpi_values"
         )
@@ -488,9 +470,38 @@ def update_equity_plot(state_value, round_value, disagg_value, selected_kpi):
         .sort_values(by=["Indicator_Type", "Indicator"])
     )
 
+
+# create equity plot function
+@callback(
+    Output("state-equity-plot", "figure"),
+    Output("selections", "data"),
+    Input("dd-states-equity", "value"),
+    Input("dd-equity-round", "value"),
+    Input("dd-equity-disagg", "value"),
+    Input("equity-session", "data"),
+)
+@cached_callback("equity-plot")
+def update_equity_plot(state_value, round_value, disagg_value, selected_kpi):
+
+    kpi_values = selected_kpi["kpis"]
+
+    if not kpi_values:
+        return label_no_fig, {}
+
+    col_map = equity_dom_cat[disagg_value]["categories"]
+    tip_val = (
+        equity_dom_cat[disagg_value]["a_b_categories"]
+        if disagg_value != "Total"
+        else ["Total"]
+    )
+
+    # bar colors
+    bar_colors = ["Total", *col_map] if disagg_value != "Total" else col_map
+    display_df = equity_display_df(state_value, round_value, disagg_value, kpi_values)
+
     # no data available for selections
     if display_df.empty:
-        return {}, label_no_fig, {}
+        return label_no_fig, {}
 
     # display_df in bars
     fig = (
@@ -506,6 +517,33 @@ def update_equity_plot(state_value, round_value, disagg_value, selected_kpi):
         .update_layout(title_x=0.5, xaxis_title=None)
     )
 
+    return (
+        fig,
+        {"tip_val": tip_val, "col_map": bar_colors, "disagg": disagg_value},
+    )
+
+
+# %%
+# create equity datatable function: data kept server-side, handle to browser
+@callback(
+    Output("df-equity", "data"),
+    Input("dd-states-equity", "value"),
+    Input("dd-equity-round", "value"),
+    Input("dd-equity-disagg", "value"),
+    Input("equity-session", "data"),
+    State("session-id", "data"),
+)
+def store_equity_table(
+    state_value, round_value, disagg_value, selected_kpi, session_id
+):
+    kpi_values = selected_kpi["kpis"] if selected_kpi else []
+    if not kpi_values:
+        return None
+
+    display_df = equity_display_df(state_value, round_value, disagg_value, kpi_values)
+    if display_df.empty:
+        return None
+
     # add disaggregation for download reference
     display_df["Disaggregation"] = disagg_value
     # prettify column names
@@ -513,13 +551,11 @@ def update_equity_plot(state_value, round_value, disagg_value, selected_kpi):
         columns={"value": col_total, "Indicator_Type": "Indicator Type"},
         inplace=True,
     )
-
-    return (
-        display_df[[col for col in sel_col_dwd if col != col_equity]].to_json(
-            orient="split"
+    return result_store.put(
+        session_id,
+        display_df[[col for col in sel_col_dwd if col != col_equity]].reset_index(
+            drop=True
         ),
-        fig,
-        {"tip_val": tip_val, "col_map": bar_colors, "disagg": disagg_value},
     )
 
 
@@ -554,20 +590,15 @@ def update_top_bottom(data_selected):
 # callback to display datatable equity
 @callback(
     Output("table-col-equity", "children"),
-    Input("df-equity", "children"),
+    Input("df-equity", "data"),
     Input("dd-equity-top", "value"),
     Input("dd-equity-bot", "value"),
 )
-def update_equity_table(df_plotted, top_value, bot_value):
-    if not df_plotted:
+def update_equity_table(equity_handle, top_value, bot_value):
+    df = result_store.get(equity_handle)
+    if df is None:
         return None
     else:
-        df = pd.read_json(df_plotted, orient="split").rename(
-            columns={
-                "value": col_total,
-                "Indicator_Type": "Indicator Type",
-            }
-        )
 
         # replace percantage as unit fraction
         df.loc[:, col_total] = df[col_total] / 100
@@ -671,16 +702,15 @@ def update_equity_table(df_plotted, top_value, bot_value):
 @callback(
     Output("table-dwd-equity", "data"),
     Input("btn-dwd-equity", "n_clicks"),
-    State("df-equity", "children"),
+    State("df-equity", "data"),
 )
-def download_equity(_, df_plotted):
-    if not df_plotted:
+def download_equity(_, equity_handle):
+    df_plotted = result_store.get(equity_handle)
+    if df_plotted is None:
         return None
     else:
 
-        df = pd.read_json(df_plotted, orient="split").rename(
-            columns={col_total: "value [%]"}
-        )
+        df = df_plotted.rename(columns={col_total: "value [%]"})
         # replace unit fraction as percantage
         # df.loc[:, "value [%]"] = (df["value [%]"] * 100).round(2)
 
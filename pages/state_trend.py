@@ -10,6 +10,8 @@ from . import (
     label_no_fig,
     states_kpi_index,
 )
+from .figure_factory import webgl_point_threshold, webgl_series_threshold
+from .response_cache import cached_callback
 
 register_page(__name__, path="/state-trend", title="State Trends")
 
@@ -232,6 +234,7 @@ def update_selectors(checked_states, checked_kpis):
     Input("trend-session", "data"),
     Input("dd-residence", "value"),
 )
+@cached_callback("state-trend")
 def update_trend(selections, residence):
 
     state_values = selections["states"]
@@ -269,14 +272,19 @@ def update_trend(selections, residence):
             lambda x: x.replace("\n", "<br>")
         )
         display_df.set_index(["State", "Indicator"], inplace=True)
+        # many series or points: WebGL lines (no spline shape in scattergl)
+        use_webgl = (
+            display_df.index.nunique() > webgl_series_threshold
+            or len(display_df) > webgl_point_threshold
+        )
         trend_fig = px.line(
             display_df,
             x="Year (give as a period)",
             y="value",
             labels={"Year (give as a period)": "Year", "variable": "Residence"},
             color=list(display_df.index),
-            line_shape="spline",
-            render_mode="svg,",
+            line_shape="linear" if use_webgl else "spline",
+            render_mode="webgl" if use_webgl else "svg",
             hover_data=["NFHS", "variable"],
         ).update_traces(mode="lines+markers")
 
@@ -0,0 +1,353 @@
+from collections import defaultdict
+import gzip
+import math
+import os
+import shutil
+
+from flask import Blueprint, Response, abort, request
+import numpy as np
+
+from . import data_version, district_geo_keys, geo_dict, geo_json_dict
+from .geo_api import rdp_mask
+from .response_cache import cache_dir
+
+# %%
+# mapbox vector tiles (z/x/y) cut at build time, served from disk
+tiles_dir = os.path.join(cache_dir, "tiles")
+tile_extent = 4096
+# clip margin around each tile (tile units): no seams at tile edges
+tile_buffer = 64
+# simplification tolerance in tile units (4096 per tile side)
+tile_tolerance = 4
+tile_min_zoom = 3
+tile_max_zoom = 10
+# versioned urls: tiles never change for a data snapshot
+tile_cache_control = "public, max-age=31536000, immutable"
+
+# boundary layers: features and their id property (finer admin levels, e.g.
+# sub-districts, are added here with their own boundary file)
+tile_layers = {
+    "districts": (geo_json_dict["features"], "707_dist_7"),
+}
+
+# mapbox geometry commands
+cmd_move_to = 1
+cmd_line_to = 2
+cmd_close_path = 7
+
+
+# %%
+# protobuf encoding (vector_tile.proto v2)
+def varint(n):
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def field_varint(field, n):
+    return varint(field << 3) + varint(n)
+
+
+def field_bytes(field, payload):
+    return varint(field << 3 | 2) + varint(len(payload)) + payload
+
+
+def field_packed(field, values):
+    return field_bytes(field, b"".join(varint(v) for v in values))
+
+
+def command(command_id, count):
+    return command_id & 0x7 | count << 3
+
+
+# polygons (lists of integer rings, first exterior) as geometry commands
+def encode_geometry(polygons):
+    geometry = []
+    cursor_x = cursor_y = 0
+    for rings in polygons:
+        for ring in rings:
+            geometry.append(command(cmd_move_to, 1))
+            for i, (x, y) in enumerate(ring):
+                if i == 1:
+                    geometry.append(command(cmd_line_to, len(ring) - 1))
+                geometry += [zigzag(x - cursor_x), zigzag(y - cursor_y)]
+                cursor_x, cursor_y = x, y
+            geometry.append(command(cmd_close_path, 1))
+    return geometry
+
+
+# one layer, features: [(id value, polygons)], property "id"
+def encode_tile(layer_name, features):
+    values = list(dict.fromkeys(feature_id for feature_id, _ in features))
+    value_index = {value: i for i, value in enumerate(values)}
+    layer = field_varint(15, 2) + field_bytes(1, layer_name.encode())
+    for feature_id, polygons in features:
+        feature = (
+            field_packed(2, [0, value_index[feature_id]])
+            # geometry type: polygon
+            + field_varint(3, 3)
+            + field_packed(4, encode_geometry(polygons))
+        )
+        layer += field_bytes(2, feature)
+    layer += field_bytes(3, b"id")
+    for value in values:
+        layer += field_bytes(4, field_bytes(1, value.encode()))
+    layer += field_varint(5, tile_extent)
+    return field_bytes(3, layer)
+
+
+# %%
+# lon/lat to web mercator world coordinates (tile units) at a zoom
+def project(coordinates, zoom):
+    scale = tile_extent * 2**zoom
+    lon = coordinates[:, 0]
+    lat = np.radians(np.clip(coordinates[:, 1], -85.0511, 85.0511))
+    x = (lon + 180) / 360 * scale
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2 * scale
+    return np.column_stack([x, y])
+
+
+# Sutherland-Hodgman against the square [low, high] (ring without closing point)
+def clip_ring(points, low, high):
+    for axis, bound, keep_above in [
+        (0, low, True),
+        (0, high, False),
+        (1, low, True),
+        (1, high, False),
+    ]:
+        if not points:
+            break
+        clipped = []
+        prev = points[-1]
+        prev_in = prev[axis] >= bound if keep_above else prev[axis] <= bound
+        for point in points:
+            point_in = point[axis] >= bound if keep_above else point[axis] <= bound
+            if point_in != prev_in:
+                t = (bound - prev[axis]) / (point[axis] - prev[axis])
+                clipped.append(
+                    (
+                        prev[0] + t * (point[0] - prev[0]),
+                        prev[1] + t * (point[1] - prev[1]),
+                    )
+                )
+            if point_in:
+                clipped.append(point)
+            prev, prev_in = point, point_in
+        points = clipped
+    return points
+
+
+# integer ring with spec winding (exterior: positive area in tile coordinates)
+def tidy_ring(points, exterior):
+    ring = []
+    for x, y in points:
+        point = (int(round(x)), int(round(y)))
+        if not ring or point != ring[-1]:
+            ring.append(point)
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+    if len(ring) < 3:
+        return None
+    area = sum(
+        x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1])
+    )
+    if area == 0:
+        return None
+    if (area > 0) != exterior:
+        ring.reverse()
+    return ring
+
+
+# %%
+# polygons of a feature projected and simplified at a zoom
+def feature_polygons(geometry, zoom):
+    polygons = (
+        [geometry["coordinates"]]
+        if geometry["type"] == "Polygon"
+        else geometry["coordinates"]
+    )
+    projected = []
+    for polygon in polygons:
+        rings = []
+        for ring in polygon:
+            points = project(np.asarray(ring, dtype="float64"), zoom)
+            if len(points) > 4:
+                keep = rdp_mask(points, tile_tolerance)
+                if keep.sum() >= 4:
+                    points = points[keep]
+            rings.append(points)
+        projected.append(rings)
+    return projected
+
+
+# all tiles of one layer at one zoom: {(x, y): [(id value, polygons)]}
+def cut_tiles(layer_name, zoom):
+    features, id_property = tile_layers[layer_name]
+    tiles = defaultdict(list)
+    for feature in features:
+        feature_tiles = defaultdict(list)
+        for rings in feature_polygons(feature["geometry"], zoom):
+            (x_min, y_min), (x_max, y_max) = rings[0].min(0), rings[0].max(0)
+            for tile_x in range(
+                int((x_min - tile_buffer) // tile_extent),
+                int((x_max + tile_buffer) // tile_extent) + 1,
+            ):
+                for tile_y in range(
+                    int((y_min - tile_buffer) // tile_extent),
+                    int((y_max + tile_buffer) // tile_extent) + 1,
+                ):
+                    origin = np.array([tile_x, tile_y]) * tile_extent
+                    clipped = []
+                    for i, points in enumerate(rings):
+                        ring = tidy_ring(
+                            clip_ring(
+                                [tuple(p) for p in (points[:-1] - origin).tolist()],
+                                -tile_buffer,
+                                tile_extent + tile_buffer,
+                            ),
+                            exterior=i == 0,
+                        )
+                        if ring is None and i == 0:
+                            break
+                        if ring is not None:
+                            clipped.append(ring)
+                    if clipped:
+                        feature_tiles[(tile_x, tile_y)].append(clipped)
+        for tile, polygons in feature_tiles.items():
+            tiles[tile].append((feature["properties"][id_property], polygons))
+    return tiles
+
+
+def tile_path(layer_name, zoom, x, y):
+    return os.path.join(
+        tiles_dir, data_version, layer_name, str(zoom), str(x), f"{y}.pbf"
+    )
+
+
+# write one zoom of a layer (gzip tiles), return number of tiles and bytes
+def write_tiles(layer_name, zoom):
+    tile_count = tile_bytes = 0
+    for (x, y), features in cut_tiles(layer_name, zoom).items():
+        path = tile_path(layer_name, zoom, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = gzip.compress(encode_tile(layer_name, features), 6, mtime=0)
+        with open(path, "wb") as f:
+            f.write(payload)
+        tile_count += 1
+        tile_bytes += len(payload)
+    return tile_count, tile_bytes
+
+
+# tiles of previous data versions
+def remove_stale_tiles():
+    for version in os.listdir(tiles_dir):
+        if version != data_version:
+            shutil.rmtree(os.path.join(tiles_dir, version), ignore_errors=True)
+
+
+os.makedirs(tiles_dir, exist_ok=True)
+
+
+# %%
+# district label points (area-weighted centroid of the largest polygon)
+def polygon_centroid(ring):
+    x, y = np.asarray(ring, dtype="float64").T
+    cross = x * np.roll(y, -1) - np.roll(x, -1) * y
+    area = cross.sum() / 2
+    if area == 0:
+        return abs(area), x.mean(), y.mean()
+    return (
+        abs(area),
+        ((x + np.roll(x, -1)) * cross).sum() / (6 * area),
+        ((y + np.roll(y, -1)) * cross).sum() / (6 * area),
+    )
+
+
+def feature_centroid(geometry):
+    polygons = (
+        [geometry["coordinates"]]
+        if geometry["type"] == "Polygon"
+        else geometry["coordinates"]
+    )
+    _, lon, lat = max(polygon_centroid(polygon[0]) for polygon in polygons)
+    return lon, lat
+
+
+district_centroids = {
+    feature["properties"]["707_dist_7"]: feature_centroid(feature["geometry"])
+    for feature in geo_json_dict["features"]
+}
+# aligned with the district rows of the precomputed matrices
+district_lon, district_lat = np.array(
+    [district_centroids.get(key, (np.nan, np.nan)) for key in district_geo_keys]
+).T
+
+
+# map view (center, zoom) fitting a scope's districts in the map div
+def fit_view(features, width=900, height=550):
+    coordinates = np.concatenate(
+        [
+            np.asarray(ring, dtype="float64")
+            for feature in features
+            for polygon in (
+                [feature["geometry"]["coordinates"]]
+                if feature["geometry"]["type"] == "Polygon"
+                else feature["geometry"]["coordinates"]
+            )
+            for ring in polygon[:1]
+        ]
+    )
+    (lon_min, lat_min), (lon_max, lat_max) = coordinates.min(0), coordinates.max(0)
+    y_min, y_max = project(np.array([[0, lat_max], [0, lat_min]]), 0)[:, 1]
+    # mapbox: 512 px world width at zoom 0
+    zoom = min(
+        math.log2(width * 360 / (512 * max(lon_max - lon_min, 1e-6))),
+        math.log2(height * tile_extent / (512 * max(y_max - y_min, 1e-9))),
+    )
+    return {
+        "center": {"lon": (lon_min + lon_max) / 2, "lat": (lat_min + lat_max) / 2},
+        "zoom": round(zoom - 0.2, 2),
+    }
+
+
+scope_map_view = {
+    "All India": fit_view(geo_json_dict["features"]),
+    **{state: fit_view(features) for state, features in geo_dict.items() if features},
+}
+
+# %%
+# flask route: /tiles/<data version>/<layer>/<z>/<x>/<y>.pbf
+tile_blueprint = Blueprint("vector_tiles", __name__)
+
+
+@tile_blueprint.route("/tiles/<version>/<layer_name>/<int:z>/<int:x>/<int:y>.pbf")
+def serve_tile(version, layer_name, z, x, y):
+    if version != data_version or layer_name not in tile_layers:
+        abort(404)
+    path = tile_path(layer_name, z, x, y)
+    if not os.path.exists(path):
+        # outside the boundaries, zoom or tiles not built (yet): never cached
+        response = Response(status=204)
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    with open(path, "rb") as f:
+        payload = f.read()
+    response = Response(payload, mimetype="application/vnd.mapbox-vector-tile")
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response.set_data(gzip.decompress(payload))
+    response.headers["Cache-Control"] = tile_cache_control
+    response.headers["Vary"] = "Accept-Encoding"
+    return response